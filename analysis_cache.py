@@ -0,0 +1,88 @@
+import sqlite3
+import threading
+import time
+from config import ANALYSIS_CACHE_PATH, ANALYSIS_CACHE_TTL_DAYS, ANALYSIS_CACHE_MAX_ENTRIES
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS analyses (
+    image_hash TEXT NOT NULL,
+    model TEXT NOT NULL,
+    prompt_version INTEGER NOT NULL,
+    analysis TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (image_hash, model, prompt_version)
+);
+CREATE INDEX IF NOT EXISTS idx_analyses_last_used ON analyses(last_used);
+"""
+
+class AnalysisCache:
+    """Disk-backed cache of poster analyses keyed by image hash, model and prompt version"""
+
+    def __init__(self, db_path=ANALYSIS_CACHE_PATH, ttl_days=ANALYSIS_CACHE_TTL_DAYS,
+                 max_entries=ANALYSIS_CACHE_MAX_ENTRIES):
+        self.ttl_seconds = ttl_days * 24 * 3600
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(SCHEMA)
+
+    def get(self, image_hash, model, prompt_version):
+        """Return the cached analysis text, or None if missing or expired"""
+        now = time.time()
+        key = (image_hash, model, prompt_version)
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                'SELECT analysis, created_at FROM analyses '
+                'WHERE image_hash = ? AND model = ? AND prompt_version = ?',
+                key
+            ).fetchone()
+            if row and now - row[1] <= self.ttl_seconds:
+                self._conn.execute(
+                    'UPDATE analyses SET last_used = ? '
+                    'WHERE image_hash = ? AND model = ? AND prompt_version = ?',
+                    (now, *key)
+                )
+                self.hits += 1
+                return row[0]
+            self.misses += 1
+            return None
+
+    def put(self, image_hash, model, prompt_version, analysis):
+        """Store a successful analysis"""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO analyses '
+                '(image_hash, model, prompt_version, analysis, created_at, last_used) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (image_hash, model, prompt_version, analysis, now, now)
+            )
+
+    def evict(self):
+        """Drop expired entries, then the least recently used ones above max_entries"""
+        with self._lock, self._conn:
+            expired = self._conn.execute(
+                'DELETE FROM analyses WHERE created_at < ?', (time.time() - self.ttl_seconds,)
+            ).rowcount
+            overflow = self._conn.execute(
+                'DELETE FROM analyses WHERE rowid IN ('
+                '  SELECT rowid FROM analyses ORDER BY last_used DESC LIMIT -1 OFFSET ?'
+                ')',
+                (self.max_entries,)
+            ).rowcount
+        return expired + overflow
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def report(self):
+        """Print cache effectiveness for this run"""
+        print(
+            f"Analysis cache: {self.hits} hits, {self.misses} misses "
+            f"({self.hit_rate():.0%} hit rate)"
+        )
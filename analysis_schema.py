@@ -0,0 +1,100 @@
+"""
+Typed schema for the poster analyses returned by the vision model.
+
+The model is asked for structured output matching RESPONSE_FORMAT; replies
+are parsed once with raw_decode (no regex scan) and validated into a
+PosterAnalysis. Anything that does not fit raises MalformedAnalysis.
+"""
+
+import json
+from dataclasses import dataclass, field, asdict
+from typing import List, Optional
+
+TEXT_FIELDS = ['event_name', 'date', 'time', 'location', 'description', 'event_type']
+
+class MalformedAnalysis(ValueError):
+    """The model's reply is not a usable analysis object"""
+
+@dataclass
+class PosterAnalysis:
+    event_name: Optional[str] = None
+    date: Optional[str] = None
+    time: Optional[str] = None
+    location: Optional[str] = None
+    description: Optional[str] = None
+    event_type: Optional[str] = None
+    key_details: List[str] = field(default_factory=list)
+
+    @classmethod
+    def from_dict(cls, data):
+        """Validate a decoded JSON object, normalizing blanks to None"""
+        if not isinstance(data, dict):
+            raise MalformedAnalysis(f"expected a JSON object, got {type(data).__name__}")
+
+        values = {}
+        for name in TEXT_FIELDS:
+            values[name] = _text_value(name, data.get(name))
+
+        details = data.get('key_details')
+        if details is None:
+            details = []
+        elif isinstance(details, str):
+            details = [details]
+        elif not isinstance(details, list):
+            raise MalformedAnalysis(f"key_details must be a list, got {type(details).__name__}")
+        values['key_details'] = [text for text in (_text_value('key_details', item) for item in details) if text]
+        return cls(**values)
+
+    def to_dict(self):
+        return asdict(self)
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), ensure_ascii=False, separators=(',', ':'))
+
+def _text_value(name, value):
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+        raise MalformedAnalysis(f"{name} must be a string, got {type(value).__name__}")
+    return str(value).strip() or None
+
+_DECODER = json.JSONDecoder()
+
+def parse_analysis(text):
+    """Parse a model reply into a PosterAnalysis in a single pass"""
+    if not isinstance(text, str):
+        raise MalformedAnalysis(f"expected text, got {type(text).__name__}")
+    # Structured output is bare JSON; older replies may wrap it in prose or a code fence
+    start = text.find('{')
+    if start < 0:
+        raise MalformedAnalysis('no JSON object in reply')
+    try:
+        data, _ = _DECODER.raw_decode(text, start)
+    except ValueError as e:
+        raise MalformedAnalysis(f"invalid JSON: {e}") from None
+    return PosterAnalysis.from_dict(data)
+
+# Structured output request matching PosterAnalysis
+RESPONSE_FORMAT = {
+    'type': 'json_schema',
+    'json_schema': {
+        'name': 'poster_analysis',
+        'strict': True,
+        'schema': {
+            'type': 'object',
+            'properties': {
+                **{name: {'type': ['string', 'null']} for name in TEXT_FIELDS},
+                'key_details': {'type': 'array', 'items': {'type': 'string'}}
+            },
+            'required': TEXT_FIELDS + ['key_details'],
+            'additionalProperties': False
+        }
+    }
+}
+
+if __name__ == "__main__":
+    print(parse_analysis('Sure! ```json\n{"event_name": "Jazz Night", "date": "March 3", "key_details": "Free"}\n```'))
+    try:
+        parse_analysis('{"event_name": ["not", "text"]}')
+    except MalformedAnalysis as e:
+        print(f"Malformed: {e}")
@@ -1,77 +1,278 @@
-from flask import Flask, render_template, jsonify
+from flask import Flask, Response, render_template, jsonify, request
 import pandas as pd
 import json
+import threading
+import time
+from bisect import bisect_left
+from collections import namedtuple
 from datetime import datetime, timedelta
 import os
-from config import HOST, PORT, DEBUG, SPREADSHEET_PATH
+import re
+from config import (
+    HOST, PORT, DEBUG, EVENT_DB_PATH, EXPORT_PATHS, EVENTS_CACHE_CONTROL,
+    SSE_POLL_INTERVAL, SSE_HEARTBEAT, SSE_RETRY_MS, SSE_MAX_DELTA
+)
+from event_store import EventStore, COLUMN_LABELS, make_event_key
+from event_exporter import LOADABLE_FORMATS, parquet_available, read_events
+from date_normalizer import normalize_start
+from payload_cache import PayloadCache, data_version
+from event_stream import DeltaLog, diff_events, sse_message
 
 app = Flask(__name__)
+# Whether the server can hold many idle /api/stream connections. True for the
+# threaded dev server; serve-prod turns it off unless its workers are gevent.
+app.config['EVENT_STREAM'] = True
+
+# Immutable view of the loaded data; replaced as a whole on every rebuild, which
+# also drops every response serialized from the previous version
+EventSnapshot = namedtuple('EventSnapshot', ['signature', 'version', 'events_data', 'calendar_events', 'index', 'payloads'])
+
+# "<date>T<time> HH:MM" at the end of a query value: a '+' offset decoded as a space
+QUERY_OFFSET_SPACE_RE = re.compile(r'(T\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?) (\d{2}:?\d{2})$')
+
+# Exports written this close to the newest one count as the same export run
+EXPORT_RUN_WINDOW_NS = 60 * 10**9
+
+# Payload cache key of the unfiltered event list
+ALL_EVENTS = (None, None, None, None)
+
+class EventIndex:
+    """Calendar events sorted by start time, with a per-type breakdown"""
+    
+    def __init__(self, calendar_events):
+        entries = []
+        for event in calendar_events:
+            start = self._to_datetime(event.get('start'))
+            search_text = ' '.join(
+                str(event.get(field) or '') for field in ('title', 'description', 'location')
+            ).lower()
+            entries.append((start, event, search_text))
+        entries.sort(key=lambda entry: entry[0])
+        
+        self.all = self._columns(entries)
+        self.by_type = {}
+        for entry in entries:
+            self.by_type.setdefault(self.type_key(entry[1].get('type')), []).append(entry)
+        self.by_type = {key: self._columns(group) for key, group in self.by_type.items()}
+    
+    @staticmethod
+    def _columns(entries):
+        """Split (start, event, text) entries into parallel lists for bisect"""
+        return ([e[0] for e in entries], [e[1] for e in entries], [e[2] for e in entries])
+    
+    @staticmethod
+    def _to_datetime(value):
+        try:
+            return datetime.fromisoformat(value).replace(tzinfo=None)
+        except (TypeError, ValueError):
+            return datetime.min
+    
+    @staticmethod
+    def type_key(event_type):
+        """Normalize an event type for lookups"""
+        if isinstance(event_type, str) and event_type.strip():
+            return event_type.strip().lower()
+        return 'unknown'
+    
+    def query(self, start=None, end=None, event_type=None, text=None):
+        """Return events starting in [start, end), optionally filtered by type and text"""
+        if event_type:
+            starts, events, texts = self.by_type.get(self.type_key(event_type), ([], [], []))
+        else:
+            starts, events, texts = self.all
+        
+        lo = bisect_left(starts, start) if start else 0
+        hi = bisect_left(starts, end) if end else len(events)
+        if not text:
+            return events[lo:hi]
+        
+        needle = text.lower()
+        return [events[i] for i in range(lo, hi) if needle in texts[i]]
 
 class EventCalendarApp:
     def __init__(self):
-        self.events_data = []
+        self._snapshot = EventSnapshot(None, data_version(None), [], [], EventIndex([]), PayloadCache())
+        self._store = None
+        self.deltas = DeltaLog()
+        self._last_poll = 0.0
+        self._rebuild_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.cache_stats = {
+            'hits': 0,
+            'misses': 0,
+            'rebuilds': 0,
+            'last_rebuild_ms': 0.0,
+            'total_rebuild_ms': 0.0,
+            'undated_events': 0
+        }
         self.load_events()
     
+    @property
+    def events_data(self):
+        return self._snapshot.events_data
+    
+    def _get_store(self):
+        if self._store is None:
+            self._store = EventStore()
+        return self._store
+    
+    def _get_source_signature(self):
+        """Identify the current data: the store's version, else the newest export's (path, mtime, size)"""
+        if os.path.exists(EVENT_DB_PATH):
+            return ('store', self._get_store().data_version())
+        candidates = []
+        for fmt in LOADABLE_FORMATS + ['xlsx']:
+            if fmt == 'parquet' and not parquet_available():
+                continue
+            try:
+                stat = os.stat(EXPORT_PATHS[fmt])
+            except OSError:
+                continue
+            candidates.append((fmt, EXPORT_PATHS[fmt], stat.st_mtime_ns, stat.st_size))
+        if not candidates:
+            return None
+        # An older file must not hide a fresher export; among files from the same
+        # export run (written within seconds of each other) take the fastest format
+        newest = max(candidate[2] for candidate in candidates)
+        return next(c for c in candidates if newest - c[2] <= EXPORT_RUN_WINDOW_NS)
+    
+    def _record_stat(self, name, value=1):
+        with self._stats_lock:
+            self.cache_stats[name] += value
+    
     def load_events(self):
-        """Load events from the Excel file"""
+        """Load events from the event store (or an exported file) and rebuild the calendar cache"""
+        with self._rebuild_lock:
+            self._rebuild()
+    
+    def _rebuild(self):
+        """Read the event data and swap in a freshly formatted snapshot"""
+        started = time.perf_counter()
+        # Take the signature before reading so a concurrent write triggers another rebuild
+        signature = self._get_source_signature()
+        
         try:
-            if os.path.exists(SPREADSHEET_PATH):
-                df = pd.read_excel(SPREADSHEET_PATH, sheet_name='Greensboro Events', skiprows=3)
-                self.events_data = df.to_dict('records')
+            if signature is None:
+                events_data = []
+            elif signature[0] == 'store':
+                events_data = self._get_store().fetch_events()
+            elif signature[0] in LOADABLE_FORMATS:
+                events_data = read_events(signature[0], signature[1])
             else:
-                self.events_data = []
+                # Spreadsheet only: from before the event store, or copied without the other exports
+                df = pd.read_excel(signature[1], sheet_name='Greensboro Events', skiprows=3)
+                df = df.rename(columns={label: col for col, label in COLUMN_LABELS.items()})
+                events_data = df.fillna('').to_dict('records')
+                for event in events_data:
+                    event.update(normalize_start(event.get('date'), event.get('time'), event.get('scraped_at')))
         except Exception as e:
             print(f"Error loading events: {e}")
-            self.events_data = []
+            events_data = []
+        
+        # Single attribute assignment, so readers see either the old or the new snapshot
+        calendar_events = self._format_events(events_data)
+        payloads = PayloadCache()
+        # The unfiltered list is the largest body; encode it before any request waits on it
+        payloads.get(ALL_EVENTS, lambda: calendar_events)
+        previous = self._snapshot
+        self._snapshot = EventSnapshot(signature, data_version(signature), events_data, calendar_events,
+                                       EventIndex(calendar_events), payloads)
+        if self._snapshot.version != previous.version:
+            self.deltas.record(previous.version, self._snapshot.version,
+                               diff_events(previous.calendar_events, calendar_events))
+        
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._stats_lock:
+            self.cache_stats['rebuilds'] += 1
+            self.cache_stats['last_rebuild_ms'] = round(elapsed_ms, 2)
+            self.cache_stats['total_rebuild_ms'] = round(self.cache_stats['total_rebuild_ms'] + elapsed_ms, 2)
+            self.cache_stats['undated_events'] = sum(
+                1 for event in events_data if event.get('title') and not event.get('start_at')
+            )
+        return self._snapshot
     
-    def get_events_for_calendar(self):
-        """Format events for calendar display"""
+    def _get_current_snapshot(self):
+        """Return the cached snapshot, rebuilding it if the data changed"""
+        snapshot = self._snapshot
+        if snapshot.signature == self._get_source_signature():
+            self._record_stat('hits')
+            return snapshot
+        
+        self._record_stat('misses')
+        with self._rebuild_lock:
+            # Another request may have rebuilt while we waited for the lock
+            snapshot = self._snapshot
+            if snapshot.signature != self._get_source_signature():
+                snapshot = self._rebuild()
+        return snapshot
+    
+    def get_events_for_calendar(self, start=None, end=None, event_type=None, query=None):
+        """Return the cached calendar events, reloading only when the data changed"""
+        snapshot = self._get_current_snapshot()
+        if not (start or end or event_type or query):
+            return snapshot.calendar_events
+        return snapshot.index.query(start, end, event_type, query)
+    
+    def is_stale(self):
+        """Whether the data source has changed since the current snapshot was built"""
+        return self._snapshot.signature != self._get_source_signature()
+    
+    def poll_snapshot(self):
+        """Current snapshot, checking the data source at most once per SSE_POLL_INTERVAL.
+
+        Every open /api/stream connection calls this; the throttle keeps hundreds
+        of idle clients down to one signature lookup per interval per worker.
+        """
+        now = time.monotonic()
+        if now - self._last_poll < SSE_POLL_INTERVAL:
+            return self._snapshot
+        self._last_poll = now
+        return self._get_current_snapshot()
+    
+    def get_events_payload(self, start=None, end=None, event_type=None, query=None):
+        """Return (data version, EncodedPayload) for a calendar query, serialized once per version"""
+        snapshot = self._get_current_snapshot()
+        payload = snapshot.payloads.get(
+            (start, end, event_type, query),
+            lambda: snapshot.index.query(start, end, event_type, query)
+        )
+        return snapshot.version, payload
+    
+    def get_version(self):
+        """Return the current data version and event count"""
+        snapshot = self._get_current_snapshot()
+        return {'version': snapshot.version, 'count': len(snapshot.calendar_events)}
+    
+    def get_cache_stats(self):
+        """Return a copy of the cache counters"""
+        with self._stats_lock:
+            stats = dict(self.cache_stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        stats['cached_payloads'] = len(self._snapshot.payloads)
+        return stats
+    
+    def _format_events(self, events_data):
+        """Format events for calendar display from their precomputed start columns"""
         calendar_events = []
         
-        for event in self.events_data:
-            if pd.notna(event.get('Title', '')):
+        for event in events_data:
+            # Events without a recognizable date cannot be placed on the calendar
+            if event.get('title') and event.get('start_at'):
                 calendar_event = {
-                    'title': event.get('Title', 'Untitled Event'),
-                    'start': self._parse_event_date(event.get('Date', ''), event.get('Time', '')),
-                    'description': event.get('Description', ''),
-                    'location': event.get('Location', ''),
-                    'url': event.get('Event URL', ''),
-                    'type': event.get('Event Type', 'Unknown')
+                    # Stable across versions, so pushed deltas can update events in place
+                    'id': event.get('event_key') or make_event_key(event),
+                    'title': event.get('title', 'Untitled Event'),
+                    'start': event['start_at'],
+                    'allDay': bool(event.get('all_day')),
+                    'description': event.get('description', ''),
+                    'location': event.get('location', ''),
+                    'url': event.get('event_url', ''),
+                    'type': event.get('event_type', 'Unknown')
                 }
                 calendar_events.append(calendar_event)
         
         return calendar_events
-    
-    def _parse_event_date(self, date_str, time_str):
-        """Parse event date and time for calendar format"""
-        try:
-            if pd.isna(date_str) or not date_str:
-                return datetime.now().isoformat()
-            
-            # Try to parse the date
-            if isinstance(date_str, str):
-                # Handle various date formats
-                for fmt in ['%Y-%m-%d', '%m/%d/%Y', '%d/%m/%Y', '%B %d, %Y']:
-                    try:
-                        parsed_date = datetime.strptime(date_str, fmt)
-                        
-                        # Add time if available
-                        if pd.notna(time_str) and time_str:
-                            try:
-                                time_part = datetime.strptime(str(time_str), '%H:%M').time()
-                                parsed_date = datetime.combine(parsed_date.date(), time_part)
-                            except:
-                                pass
-                        
-                        return parsed_date.isoformat()
-                    except ValueError:
-                        continue
-            
-            return datetime.now().isoformat()
-            
-        except Exception as e:
-            print(f"Error parsing date {date_str}: {e}")
-            return datetime.now().isoformat()
 
 # Initialize the app
 calendar_app = EventCalendarApp()
@@ -81,18 +282,121 @@ def index():
     """Main calendar page"""
     return render_template('calendar.html')
 
+def _parse_query_datetime(value):
+    """Parse a FullCalendar start/end parameter into a naive local datetime"""
+    if not value:
+        return None
+    # An unescaped '+' in the UTC offset arrives as a space after URL decoding;
+    # only repair that case, not the space in a plain "2024-05-01 10:00"
+    value = QUERY_OFFSET_SPACE_RE.sub(r'\1+\2', value.strip())
+    return datetime.fromisoformat(value).replace(tzinfo=None)
+
 @app.route('/api/events')
 def get_events():
     """API endpoint to get events for calendar"""
-    calendar_app.load_events()  # Refresh data
-    events = calendar_app.get_events_for_calendar()
-    return jsonify(events)
+    try:
+        start = _parse_query_datetime(request.args.get('start'))
+        end = _parse_query_datetime(request.args.get('end'))
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': f"Invalid date range: {e}"}), 400
+    
+    version, payload = calendar_app.get_events_payload(
+        start=start,
+        end=end,
+        event_type=request.args.get('type'),
+        query=request.args.get('q')
+    )
+    
+    encoding, body, etag = payload.select(request.accept_encodings)
+    if payload.matches(request.if_none_match):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype='application/json')
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = EVENTS_CACHE_CONTROL
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['X-Data-Version'] = version
+    return response
+
+@app.route('/api/version')
+def get_version():
+    """API endpoint with the current data version, for clients deciding whether to refetch"""
+    response = jsonify(calendar_app.get_version())
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+def _stream_updates(since):
+    """Yield SSE messages for every new data version after `since`"""
+    yield f"retry: {SSE_RETRY_MS}\n\n"
+    snapshot = calendar_app.poll_snapshot()
+    if since is None:
+        yield sse_message('version', {'version': snapshot.version, 'count': len(snapshot.calendar_events)},
+                          snapshot.version)
+        since = snapshot.version
+    
+    last_sent = time.monotonic()
+    while True:
+        snapshot = calendar_app.poll_snapshot()
+        if snapshot.version != since:
+            delta = calendar_app.deltas.since(since, snapshot.version)
+            info = {'from': since, 'version': snapshot.version, 'count': len(snapshot.calendar_events)}
+            size = len(delta['added']) + len(delta['changed']) + len(delta['removed']) if delta else 0
+            if delta is None or size > SSE_MAX_DELTA:
+                yield sse_message('reset', info, snapshot.version)
+            else:
+                yield sse_message('delta', dict(info, **delta), snapshot.version)
+            since = snapshot.version
+            last_sent = time.monotonic()
+        elif time.monotonic() - last_sent >= SSE_HEARTBEAT:
+            # Comment line: keeps proxies from closing an idle connection, ignored by EventSource
+            yield ': keep-alive\n\n'
+            last_sent = time.monotonic()
+        # Cooperative under gevent workers, so idle streams cost a greenlet rather than a thread
+        time.sleep(SSE_POLL_INTERVAL)
+
+@app.route('/api/stream')
+def stream_events():
+    """Server-Sent Events stream of data versions with added/changed/removed event deltas"""
+    if not app.config['EVENT_STREAM']:
+        # 204 makes EventSource stop reconnecting; the page falls back to polling /api/version
+        return Response(status=204)
+    # EventSource resends the last id it saw when it reconnects
+    since = request.headers.get('Last-Event-ID') or request.args.get('since')
+    response = Response(_stream_updates(since), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
 
 @app.route('/api/refresh')
 def refresh_events():
     """API endpoint to refresh events data"""
     calendar_app.load_events()
-    return jsonify({'status': 'success', 'count': len(calendar_app.events_data)})
+    return jsonify({
+        'status': 'success',
+        'count': len(calendar_app.events_data),
+        'version': calendar_app.get_version()['version'],
+        'cache': calendar_app.get_cache_stats()
+    })
+
+@app.route('/healthz')
+def healthz():
+    """Liveness/readiness probe: cheap, and reports which data version this worker serves"""
+    snapshot = calendar_app._snapshot
+    response = jsonify({
+        'status': 'ok',
+        'pid': os.getpid(),
+        'version': snapshot.version,
+        'count': len(snapshot.calendar_events)
+    })
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@app.route('/api/stats')
+def get_stats():
+    """API endpoint to inspect the event cache counters"""
+    return jsonify(calendar_app.get_cache_stats())
 
 if __name__ == '__main__':
     app.run(host=HOST, port=PORT, debug=DEBUG)
@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the scraper's hot paths.
+
+Each case runs in a fresh process so peak memory numbers are not polluted by
+earlier cases.
+
+    python benchmark.py parsers                      # synthetic pages
+    python benchmark.py parsers --fixtures DIR       # saved *.html pages
+    python benchmark.py processing --events 100000   # event cleaning paths
+    python benchmark.py dedup --events 10000 50000   # near-duplicate detection
+    python benchmark.py xlsx --rows 10000 100000     # spreadsheet export modes
+"""
+
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, or None if unavailable"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS reports bytes
+    return peak / 1024 / 1024 if peak > 1 << 32 else peak / 1024
+
+def _isolated_entry(func, args, results):
+    results.put(func(*args))
+
+def run_isolated(func, *args):
+    """Run func(*args) in a fresh interpreter and return its result"""
+    ctx = multiprocessing.get_context('spawn')
+    results = ctx.Queue()
+    process = ctx.Process(target=_isolated_entry, args=(func, args, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+def time_repeated(func, repeat):
+    """Median and best wall time of `repeat` calls"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings), min(timings)
+
+def traced_peak_mb(func):
+    """Peak Python-heap allocation during one call (C-level allocations are not traced)"""
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024 / 1024
+
+def print_table(headers, rows):
+    widths = [max(len(str(h)), *(len(str(row[i])) for row in rows)) for i, h in enumerate(headers)]
+    print('  '.join(str(h).ljust(w) for h, w in zip(headers, widths)))
+    for row in rows:
+        print('  '.join(str(v).ljust(w) for v, w in zip(row, widths)))
+
+# --- HTML parser backends ---------------------------------------------------
+
+def synthetic_page(cards, seed=0):
+    """An events search page shaped like Facebook's: deep wrappers and noisy markup"""
+    rng = random.Random(seed)
+    parts = ['<html><head><title>Events</title></head><body><div id="root">']
+    for i in range(cards):
+        wrappers = rng.randint(4, 12)
+        parts.append('<div class="x1n2onr6 x1ja2u2z">' * wrappers)
+        parts.append(
+            f'<div role="article" class="x9f619 x1n2onr6">'
+            f'<a href="/events/{100000 + i}/?acontext=%7B%22ref%22%3A52%7D" role="link">'
+            f'<span class="x193iq5w">Event number {i} at Venue {rng.randint(1, 50)}</span></a>'
+            f'<img src="https://scontent.xx.fbcdn.net/v/t39/{i}_n.jpg?oh={rng.getrandbits(64):x}" alt="">'
+            f'<div class="x1lliihq">{"<span>filler</span>" * rng.randint(5, 20)}</div>'
+            f'</div>'
+        )
+        parts.append('</div>' * wrappers)
+    parts.append('</div></body></html>')
+    return ''.join(parts)
+
+def load_pages(fixtures_dir, synthetic_cards):
+    if fixtures_dir:
+        paths = sorted(glob.glob(os.path.join(fixtures_dir, '**', '*.html'), recursive=True))
+        pages = []
+        for path in paths:
+            with open(path, encoding='utf-8') as f:
+                pages.append(f.read())
+        return pages
+    return [synthetic_page(synthetic_cards, seed) for seed in range(3)]
+
+def _bench_parser(backend_name, fixtures_dir, synthetic_cards, repeat):
+    from html_parsing import get_backend
+
+    pages = load_pages(fixtures_dir, synthetic_cards)
+    backend = get_backend(backend_name)
+    baseline_rss = peak_rss_mb()
+
+    def parse_all():
+        return sum(len(backend.extract_cards(page)) for page in pages)
+
+    cards = parse_all()
+    median, best = time_repeated(parse_all, repeat)
+    heap = traced_peak_mb(parse_all)
+    rss = peak_rss_mb()
+    return {
+        'backend': backend_name,
+        'pages': len(pages),
+        'mb': sum(len(page) for page in pages) / 1024 / 1024,
+        'cards': cards,
+        'median': median,
+        'best': best,
+        'heap': heap,
+        'rss_growth': None if rss is None else rss - baseline_rss
+    }
+
+def bench_parsers(args):
+    from html_parsing import available_backends
+
+    rows = []
+    for name in available_backends():
+        r = run_isolated(_bench_parser, name, args.fixtures, args.cards, args.repeat)
+        rows.append([
+            r['backend'], r['pages'], f"{r['mb']:.1f}", r['cards'],
+            f"{r['median'] * 1000:.1f}", f"{r['best'] * 1000:.1f}", f"{r['heap']:.1f}",
+            '-' if r['rss_growth'] is None else f"{r['rss_growth']:.1f}"
+        ])
+    print_table(['backend', 'pages', 'MB', 'cards', 'median ms', 'best ms', 'py heap MB', 'RSS +MB'], rows)
+
+# --- Event cleaning ------------------------------------------------------------
+
+def synthetic_raw_events(count, seed=0):
+    """Raw events as the pipeline hands them to the processor, with messy whitespace and AI output"""
+    rng = random.Random(seed)
+    venues = ['Carolina Theatre', 'LeBauer Park', 'Greensboro Coliseum', 'Cone Denim Entertainment Center', '']
+    types = ['concert', 'festival', 'sports', 'community', 'meetup']
+    events = []
+    for i in range(count):
+        ai_fields = {
+            'event_name': f"AI Event {i}",
+            'date': f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            'time': f"{rng.randint(1, 12)}:00 PM",
+            'location': rng.choice(venues),
+            'description': 'Extracted from the poster',
+            'event_type': rng.choice(types)
+        }
+        roll = rng.random()
+        if roll < 0.6:
+            ai_analysis = {'success': True, 'data': dict(ai_fields, key_details=[])}
+        elif roll < 0.7:
+            # Saved before structured output: JSON wrapped in prose
+            ai_analysis = {'success': True, 'analysis': f"Here is the JSON:\n{json.dumps(ai_fields)}\nDone."}
+        elif roll < 0.8:
+            ai_analysis = {'success': True, 'analysis': 'I could not read this poster.'}
+        elif roll < 0.9:
+            ai_analysis = {'success': False, 'error': 'timeout'}
+        else:
+            ai_analysis = None
+        event = {
+            'title': rng.choice(['', f"  Event\n number {i}  ", f"Event\t{i}"]),
+            'date': rng.choice(['', '12/25/2024', 'March 3, 2024']),
+            'time': rng.choice(['', ' 7 PM ']),
+            'location': rng.choice(venues),
+            'description': rng.choice(['', 'Line one\n\n  line two ']),
+            'image_url': f"https://scontent.xx.fbcdn.net/v/t39/{i}_n.jpg",
+            'event_url': f"https://facebook.com/events/{100000 + i}/",
+            'local_image_path': f"event_images/{i:064x}.jpg",
+            'image_hash': f"{i:064x}",
+            'fingerprint': f"{i:040x}",
+            'scraped_at': '2024-01-01T12:00:00'
+        }
+        if ai_analysis is not None:
+            event['ai_analysis'] = ai_analysis
+        events.append(event)
+    return events
+
+def _process_per_event(raw_events):
+    """Dict-at-a-time cleaning as EventDataProcessor did before the columnar path.
+
+    Kept only as the baseline to time against and to check the columnar output.
+    """
+    import re
+    import pandas as pd
+    from data_processor import EventDataProcessor, TEXT_COLUMNS, PASSTHROUGH_COLUMNS, AI_FILL_FIELDS, EXPORT_COLUMNS
+    from date_normalizer import normalize_start
+
+    processor = EventDataProcessor()
+    clean = lambda text: re.sub(r'\s+', ' ', str(text)).strip() if text else ''
+    events = []
+    for raw in raw_events:
+        event = {column: clean(raw.get(column, '')) for column in TEXT_COLUMNS}
+        event.update({column: raw.get(column, '') for column in PASSTHROUGH_COLUMNS})
+        ai_info = processor._extract_ai_info(raw.get('ai_analysis', {}))
+        if not (event['title'] or ai_info.get('event_name')):
+            continue
+        for column, ai_field in AI_FILL_FIELDS.items():
+            if not event[column] and ai_info.get(ai_field):
+                event[column] = ai_info[ai_field]
+        event['event_type'] = ai_info.get('event_type') or 'Unknown'
+        event.update(normalize_start(event['date'], event['time'], event['scraped_at']))
+        events.append(event)
+    return pd.DataFrame([{label: event[column] for column, label in EXPORT_COLUMNS.items()} for event in events])
+
+def _process_columnar(raw_events):
+    from data_processor import EventDataProcessor
+
+    processor = EventDataProcessor()
+    return processor.export_frame(processor.process_events_frame(raw_events))
+
+PROCESSING_PATHS = {'per-event': _process_per_event, 'columnar': _process_columnar}
+
+def _bench_processing(path, count, repeat):
+    raw_events = synthetic_raw_events(count)
+    baseline_rss = peak_rss_mb()
+    process = PROCESSING_PATHS[path]
+    rows = len(process(raw_events))
+    median, best = time_repeated(lambda: process(raw_events), repeat)
+    rss = peak_rss_mb()
+    return {
+        'path': path,
+        'rows': rows,
+        'median': median,
+        'best': best,
+        'rss_growth': None if rss is None else rss - baseline_rss
+    }
+
+def bench_processing(args):
+    import pandas as pd
+
+    # Both paths must produce the same spreadsheet rows
+    sample = synthetic_raw_events(min(args.events, 20000), seed=1)
+    pd.testing.assert_frame_equal(_process_per_event(sample), _process_columnar(sample))
+    print(f"Outputs match on {len(sample)} events")
+
+    rows = []
+    for path in PROCESSING_PATHS:
+        r = run_isolated(_bench_processing, path, args.events, args.repeat)
+        rows.append([
+            r['path'], r['rows'], f"{r['median'] * 1000:.0f}", f"{r['best'] * 1000:.0f}",
+            '-' if r['rss_growth'] is None else f"{r['rss_growth']:.1f}"
+        ])
+    print_table(['path', 'rows', 'median ms', 'best ms', 'RSS +MB'], rows)
+
+# --- Near-duplicate detection ---------------------------------------------------
+
+def synthetic_archive(count, duplicate_rate=0.1, seed=0):
+    """Stored-looking events over a year of dates, with reworded reposts mixed in"""
+    rng = random.Random(seed)
+    words = ['jazz', 'night', 'market', 'farmers', 'trivia', 'yoga', 'park', 'festival', 'open', 'mic',
+             'comedy', 'show', 'brunch', 'run', 'club', 'art', 'walk', 'concert', 'series', 'workshop']
+    venues = [f"Venue {i}, Greensboro, NC" for i in range(40)]
+    events, injected = [], 0
+    while len(events) < count:
+        title = ' '.join(rng.sample(words, rng.randint(3, 5))) + f" {rng.randint(1, 999)}"
+        event = {
+            'title': title.title(),
+            'start_date': f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            'location': rng.choice(venues),
+            'event_url': f"https://facebook.com/events/{len(events)}"
+        }
+        events.append(event)
+        if rng.random() < duplicate_rate and len(events) < count:
+            events.append(dict(event, title=f"{event['title']}!", event_url=f"https://facebook.com/events/{len(events)}"))
+            injected += 1
+    return events, injected
+
+def _bench_dedup(count):
+    from event_dedup import EventDeduplicator
+
+    events, injected = synthetic_archive(count)
+    deduplicator = EventDeduplicator()
+    started = time.perf_counter()
+    duplicates = deduplicator.dedupe(events)
+    return {
+        'events': count,
+        'seconds': time.perf_counter() - started,
+        'candidates': deduplicator.stats['candidates'],
+        'found': len(duplicates),
+        'injected': injected
+    }
+
+def bench_dedup(args):
+    rows = []
+    for count in args.events:
+        r = run_isolated(_bench_dedup, count)
+        pairs = count * (count - 1) // 2
+        rows.append([
+            r['events'], f"{r['seconds']:.2f}", f"{r['seconds'] / r['events'] * 1e6:.0f}",
+            r['candidates'], pairs, r['found'], r['injected']
+        ])
+    print_table(['events', 'seconds', 'us/event', 'pairs checked', 'all pairs', 'found', 'injected'], rows)
+
+# --- Spreadsheet export ----------------------------------------------------------
+
+def synthetic_export_frame(rows, seed=0):
+    """A DataFrame with the spreadsheet's column labels, as EventExporter hands to SpreadsheetExporter"""
+    import pandas as pd
+    from event_store import COLUMN_LABELS
+
+    rng = random.Random(seed)
+    data = {label: [] for label in COLUMN_LABELS.values()}
+    for i in range(rows):
+        data['Title'].append(f"Event number {i} at Venue {rng.randint(1, 50)}")
+        data['Date'].append(f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}")
+        data['Time'].append(f"{rng.randint(1, 12)}:00 PM")
+        data['Location'].append(f"Venue {rng.randint(1, 50)}, Greensboro, NC")
+        data['Description'].append('Live music and food trucks. ' * rng.randint(1, 4))
+        data['Event Type'].append(rng.choice(['concert', 'festival', 'sports', 'community', 'meetup']))
+        data['Image URL'].append(f"https://scontent.xx.fbcdn.net/v/t39/{i}_n.jpg")
+        data['Event URL'].append(f"https://facebook.com/events/{100000 + i}/")
+        data['Scraped At'].append('2024-01-01T12:00:00')
+    return pd.DataFrame(data)
+
+def _bench_xlsx(streaming, rows):
+    from spreadsheet_exporter import SpreadsheetExporter
+
+    events_df = synthetic_export_frame(rows)
+    baseline_rss = peak_rss_mb()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'events.xlsx')
+        started = time.perf_counter()
+        SpreadsheetExporter(path, streaming=streaming).export_events(events_df)
+        seconds = time.perf_counter() - started
+        size = os.path.getsize(path)
+    rss = peak_rss_mb()
+    return {
+        'mode': 'write-only' if streaming else 'in-memory',
+        'rows': rows,
+        'seconds': seconds,
+        'mb': size / 1024 / 1024,
+        'rss_growth': None if rss is None else rss - baseline_rss
+    }
+
+def bench_xlsx(args):
+    rows = []
+    for count in args.rows:
+        for streaming in (False, True):
+            r = run_isolated(_bench_xlsx, streaming, count)
+            rows.append([
+                r['mode'], r['rows'], f"{r['seconds']:.2f}", f"{r['mb']:.1f}",
+                '-' if r['rss_growth'] is None else f"{r['rss_growth']:.0f}"
+            ])
+    print_table(['mode', 'rows', 'seconds', 'file MB', 'RSS +MB'], rows)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the event pipeline's hot paths")
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    parsers = subparsers.add_parser('parsers', help='Compare HTML parser backends')
+    parsers.add_argument('--fixtures', help='Directory of saved *.html pages (default: synthetic pages)')
+    parsers.add_argument('--cards', type=int, default=300, help='Cards per synthetic page')
+    parsers.add_argument('--repeat', type=int, default=5)
+    parsers.set_defaults(func=bench_parsers)
+
+    processing = subparsers.add_parser('processing', help='Compare per-event and columnar event cleaning')
+    processing.add_argument('--events', type=int, default=100000)
+    processing.add_argument('--repeat', type=int, default=3)
+    processing.set_defaults(func=bench_processing)
+
+    dedup = subparsers.add_parser('dedup', help='Time near-duplicate detection as the archive grows')
+    dedup.add_argument('--events', type=int, nargs='+', default=[10000, 50000])
+    dedup.set_defaults(func=bench_dedup)
+
+    xlsx = subparsers.add_parser('xlsx', help='Compare in-memory and write-only spreadsheet export')
+    xlsx.add_argument('--rows', type=int, nargs='+', default=[10000, 100000])
+    xlsx.set_defaults(func=bench_xlsx)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
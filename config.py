@@ -7,18 +7,116 @@ load_dotenv()
 LOCATION = "Greensboro, NC"
 SEARCH_RADIUS = 25  # miles
 
+# Searches covered by --multi-query: the city, nearby towns within SEARCH_RADIUS,
+# common categories and date windows
+SCRAPE_QUERIES = [
+    LOCATION,
+    "High Point, NC",
+    "Winston-Salem, NC",
+    "Burlington, NC",
+    "Jamestown, NC",
+    f"concerts {LOCATION}",
+    f"festivals {LOCATION}",
+    f"meetups {LOCATION}",
+    f"events this weekend {LOCATION}",
+    f"events next week {LOCATION}",
+]
+SCRAPE_WORKERS = 3  # headless browser processes for --multi-query
+
 # AI API settings
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
+OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL')  # e.g. http://127.0.0.1:8765/v1 for openai_stub_server.py
+OPENAI_VISION_MODEL = "gpt-4o"  # needs vision and structured (json_schema) output
+ANALYSIS_PROMPT_VERSION = 2  # bump whenever the analysis prompt or response format changes
+
+# AI analysis concurrency and rate limits
+ANALYSIS_CONCURRENCY = 4
+ANALYSIS_REQUESTS_PER_MINUTE = 60
+ANALYSIS_TOKENS_PER_MINUTE = 30000
+ANALYSIS_ESTIMATED_TOKENS = 1300  # image + prompt + max_tokens, corrected from reported usage
+ANALYSIS_MAX_RETRIES = 5
+
+# Poster preprocessing before upload to the vision model
+POSTER_MAX_EDGE = 1024  # pixels
+POSTER_FORMAT = 'JPEG'  # 'JPEG' or 'WEBP'
+POSTER_QUALITY = 80
+
+# AI analysis cache settings
+ANALYSIS_CACHE_PATH = 'analysis_cache.db'
+ANALYSIS_CACHE_TTL_DAYS = 30
+ANALYSIS_CACHE_MAX_ENTRIES = 5000
 
 # Output settings
+EVENT_DB_PATH = 'greensboro_events.db'
 SPREADSHEET_PATH = 'greensboro_events.xlsx'
+XLSX_STREAMING = True  # write-only workbook with shared named styles; False for the in-memory formatter
+EXPORT_PATHS = {
+    'xlsx': SPREADSHEET_PATH,
+    'parquet': 'greensboro_events.parquet',
+    'csv': 'greensboro_events.csv.gz',
+    'ndjson': 'greensboro_events.ndjson',
+    'ics': 'greensboro_events.ics'
+}
+DEFAULT_EXPORT_FORMATS = ['xlsx']
+REPLAY_OUTPUT_DIR = 'output'  # under the --replay directory: its own event store and exports, rebuilt per replay
 IMAGES_DIR = 'event_images'
 
+# Streaming pipeline settings
+PIPELINE_QUEUE_SIZE = 32  # max events waiting between two stages
+
+# Image download settings
+IMAGE_DOWNLOAD_WORKERS = 8
+IMAGE_DOWNLOAD_PER_HOST = 4  # max open connections to any one host
+IMAGE_DOWNLOAD_RETRIES = 3
+IMAGE_DOWNLOAD_TIMEOUT = 10  # seconds
+
 # Web server settings
 HOST = '127.0.0.1'
 PORT = 5000
 DEBUG = True
+EVENTS_CACHE_CONTROL = 'no-cache'  # browsers may store /api/events but must revalidate (ETag -> 304)
+PAYLOAD_CACHE_SIZE = 64  # serialized /api/events responses kept per data version
+PAYLOAD_COMPRESS_MIN_BYTES = 1024
+PAYLOAD_GZIP_LEVEL = 6
+PAYLOAD_BROTLI_QUALITY = 5  # 11 is far slower on large payloads for a few percent
+
+# Production server settings (--mode serve-prod)
+WSGI_WORKERS = min(4, os.cpu_count() or 1)  # gunicorn worker processes
+WSGI_THREADS = 4  # threads per worker (waitress: total threads = workers * threads)
+WSGI_TIMEOUT = 30  # seconds
+DATA_WATCH_INTERVAL = 5  # seconds between checks for new event data; 0 disables reloads
+WSGI_WORKER_CONNECTIONS = 1000  # open connections per gevent worker (idle /api/stream clients)
+
+# Live updates over Server-Sent Events (/api/stream)
+SSE_POLL_INTERVAL = 2  # seconds between data version checks, shared by every stream in a worker
+SSE_HEARTBEAT = 15  # seconds of silence before a keep-alive comment
+SSE_RETRY_MS = 5000  # browser reconnect delay after a dropped stream
+SSE_DELTA_HISTORY = 16  # versions a reconnecting client can catch up from with a delta
+SSE_MAX_DELTA = 500  # larger deltas tell the client to refetch instead
 
 # Browser settings
 HEADLESS = True
 BROWSER_TIMEOUT = 30
+BROWSER_LIGHTWEIGHT = True  # skip images, notifications, extensions etc. in Chrome
+CHROMEDRIVER_PATH = os.getenv('CHROMEDRIVER_PATH')  # pin a driver binary explicitly
+DRIVER_CACHE_FILE = '.chromedriver_cache.json'  # remembers the webdriver-manager result
+
+# HTML parser backend: 'auto' (fastest installed), 'selectolax', 'lxml' or 'html.parser'
+PARSER_BACKEND = 'auto'
+
+# Scroll loading settings
+SCRAPE_TARGET_EVENTS = 200  # stop scrolling once this many events are found
+SCRAPE_MAX_SCROLLS = 50
+PAGE_READY_TIMEOUT = 15  # seconds to wait for the first event cards
+SCROLL_WAIT_TIMEOUT = 8  # seconds to wait for new content after a scroll
+SCROLL_POLL_INTERVAL = 0.25
+
+# Date normalization
+DATE_CACHE_SIZE = 8192  # distinct (date, time, scrape day) strings kept parsed
+
+# Near-duplicate detection
+DEDUP_TITLE_SIMILARITY = 0.8  # estimated Jaccard of title shingles for a title-only match
+DEDUP_POSTER_TITLE_SIMILARITY = 0.3  # title similarity still required when posters match
+DEDUP_POSTER_DISTANCE = 6  # max differing bits between 64-bit poster hashes
+DEDUP_NUM_PERM = 64  # MinHash permutations per title
+DEDUP_LSH_BANDS = 16  # LSH bands; DEDUP_NUM_PERM must divide evenly
@@ -1,134 +1,146 @@
 import pandas as pd
-from datetime import datetime
-import re
-import json
+from date_normalizer import normalize_start
+from analysis_schema import MalformedAnalysis, parse_analysis
+from event_store import START_COLUMNS
+
+# Columns cleaned with whitespace normalization, and columns copied as-is
+TEXT_COLUMNS = ['title', 'date', 'time', 'location', 'description']
+PASSTHROUGH_COLUMNS = ['image_url', 'event_url', 'local_image_path', 'image_hash', 'fingerprint', 'scraped_at']
+
+# Event column -> AI field used to fill it when the scraped value is empty
+AI_FILL_FIELDS = {
+    'title': 'event_name',
+    'date': 'date',
+    'time': 'time',
+    'location': 'location',
+    'description': 'description'
+}
+
+# Event column -> spreadsheet label, in export order
+EXPORT_COLUMNS = {
+    'title': 'Title',
+    'date': 'Date',
+    'time': 'Time',
+    'location': 'Location',
+    'description': 'Description',
+    'event_type': 'Event Type',
+    'image_url': 'Image URL',
+    'event_url': 'Event URL',
+    'scraped_at': 'Scraped At'
+}
+
+def _truthy(series):
+    """Element-wise truthiness of an object Series, treating NaN as empty"""
+    return series.notna() & series.astype(bool)
 
 class EventDataProcessor:
+    """Collect raw events as they arrive and clean them in one columnar pass"""
+    
     def __init__(self):
+        self.raw_events = []
         self.processed_events = []
+        self.ai_stats = {'structured': 0, 'parsed': 0, 'malformed': 0}
+    
+    def add_event(self, raw_event):
+        """Queue one raw event for the next process_events() call"""
+        self.raw_events.append(raw_event)
     
-    def process_events(self, raw_events):
-        """Clean and standardize event data"""
-        for event in raw_events:
-            processed_event = self._clean_event_data(event)
-            if processed_event:
-                self.processed_events.append(processed_event)
+    def process_events(self, raw_events=None):
+        """Clean, fill from AI data and normalize every queued (and given) event.
         
+        Returns the processed events as dicts, with None for missing values.
+        """
+        if raw_events is not None:
+            self.raw_events.extend(raw_events)
+        df = self.process_events_frame(self.raw_events)
+        self.processed_events = df.astype(object).where(df.notna(), None).to_dict('records')
         return self.processed_events
     
-    def _clean_event_data(self, event):
-        """Clean individual event data"""
-        cleaned = {
-            'title': self._clean_text(event.get('title', '')),
-            'date': self._parse_date(event.get('date', '')),
-            'time': self._clean_text(event.get('time', '')),
-            'location': self._clean_text(event.get('location', '')),
-            'description': self._clean_text(event.get('description', '')),
-            'image_url': event.get('image_url', ''),
-            'event_url': event.get('event_url', ''),
-            'local_image_path': event.get('local_image_path', ''),
-            'scraped_at': event.get('scraped_at', ''),
-            'ai_extracted_info': self._extract_ai_info(event.get('ai_analysis', {}))
-        }
+    def _extract_ai_info(self, ai_analysis):
+        """Extract structured information from AI analysis"""
+        if not ai_analysis or not ai_analysis.get('success'):
+            return {}
         
-        # Only keep events with meaningful data
-        if cleaned['title'] or cleaned['ai_extracted_info'].get('event_name'):
-            return cleaned
+        # Validated by ImageAnalyzer when the reply arrived
+        if 'data' in ai_analysis:
+            self.ai_stats['structured'] += 1
+            return ai_analysis['data']
         
-        return None
+        # Results saved before structured output only carry the reply text
+        try:
+            info = parse_analysis(ai_analysis.get('analysis')).to_dict()
+        except MalformedAnalysis:
+            self.ai_stats['malformed'] += 1
+            return {'raw_analysis': ai_analysis.get('analysis', '')}
+        self.ai_stats['parsed'] += 1
+        return info
     
-    def _clean_text(self, text):
-        """Clean and normalize text data"""
-        if not text:
-            return ''
-        
-        # Remove extra whitespace and normalize
-        text = re.sub(r'\s+', ' ', str(text)).strip()
-        return text
+    def get_dataframe(self):
+        """Processed events as spreadsheet columns"""
+        return self.export_frame(pd.DataFrame(self.processed_events))
     
-    def _parse_date(self, date_str):
-        """Attempt to parse and standardize date formats"""
-        if not date_str:
-            return ''
+    def process_events_frame(self, raw_events):
+        """Clean a batch of raw events into one DataFrame.
         
-        # Common date patterns
-        date_patterns = [
-            r'(\d{1,2})/(\d{1,2})/(\d{4})',
-            r'(\d{4})-(\d{1,2})-(\d{1,2})',
-            r'(\w+)\s+(\d{1,2}),?\s+(\d{4})'
-        ]
+        Text is cleaned with vectorized string operations, empty fields are
+        filled from the AI analysis, and typed start columns are added.
+        """
+        columns = ['ai_analysis'] + TEXT_COLUMNS + PASSTHROUGH_COLUMNS
+        df = pd.DataFrame.from_records(list(raw_events), columns=columns)
         
-        for pattern in date_patterns:
-            match = re.search(pattern, str(date_str))
-            if match:
-                return date_str  # Return original for now, could standardize format
+        for column in TEXT_COLUMNS:
+            df[column] = self._clean_text_column(df[column])
+        for column in PASSTHROUGH_COLUMNS:
+            df[column] = df[column].fillna('')
+        df['ai_extracted_info'] = self._extract_ai_info_column(df.pop('ai_analysis'))
         
-        return date_str
-    
-    def _extract_ai_info(self, ai_analysis):
-        """Extract structured information from AI analysis"""
-        if not ai_analysis or not ai_analysis.get('success'):
-            return {}
+        ai_fields = list(AI_FILL_FIELDS.values()) + ['event_type']
+        ai = pd.DataFrame.from_records(df['ai_extracted_info'].tolist(), index=df.index, columns=ai_fields)
         
-        try:
-            # Try to parse JSON from AI response
-            analysis_text = ai_analysis.get('analysis', '')
-            
-            # Look for JSON in the response
-            json_match = re.search(r'\{.*\}', analysis_text, re.DOTALL)
-            if json_match:
-                return json.loads(json_match.group())
-        except:
-            pass
+        # Only keep events with meaningful data
+        keep = (df['title'] != '') | _truthy(ai['event_name'])
+        df, ai = df[keep], ai[keep]
         
-        return {'raw_analysis': ai_analysis.get('analysis', '')}
-    
-    def merge_ai_data(self):
-        """Merge AI-extracted data with scraped data"""
-        for event in self.processed_events:
-            ai_info = event.get('ai_extracted_info', {})
-            
-            # Use AI data to fill in missing fields
-            if not event['title'] and ai_info.get('event_name'):
-                event['title'] = ai_info['event_name']
-            
-            if not event['date'] and ai_info.get('date'):
-                event['date'] = ai_info['date']
-            
-            if not event['time'] and ai_info.get('time'):
-                event['time'] = ai_info['time']
-            
-            if not event['location'] and ai_info.get('location'):
-                event['location'] = ai_info['location']
-            
-            if not event['description'] and ai_info.get('description'):
-                event['description'] = ai_info['description']
-            
-            # Add event type from AI
-            event['event_type'] = ai_info.get('event_type', 'Unknown')
+        # Use AI data to fill in missing fields
+        for column, ai_field in AI_FILL_FIELDS.items():
+            scraped = df[column].mask(df[column] == '')
+            df[column] = scraped.combine_first(ai[ai_field].where(_truthy(ai[ai_field]))).fillna('')
+        df['event_type'] = ai['event_type'].where(_truthy(ai['event_type']), 'Unknown')
+        
+        df = df.reset_index(drop=True)
+        # Normalize each distinct (date, time, scrape day) once and broadcast back
+        scrape_day = df['scraped_at'].astype(str).str.slice(0, 10)
+        codes, uniques = pd.MultiIndex.from_arrays(
+            [df['date'].astype(str), df['time'].astype(str), scrape_day]
+        ).factorize()
+        starts = pd.DataFrame.from_records([normalize_start(*values) for values in uniques], columns=START_COLUMNS)
+        return pd.concat([df, starts.take(codes).reset_index(drop=True)], axis=1)
     
-    def get_dataframe(self):
-        """Convert processed events to pandas DataFrame"""
-        if not self.processed_events:
+    def export_frame(self, df):
+        """Spreadsheet columns from processed events"""
+        if df.empty:
             return pd.DataFrame()
-        
-        # Flatten the data for spreadsheet export
-        flattened_events = []
-        for event in self.processed_events:
-            flat_event = {
-                'Title': event['title'],
-                'Date': event['date'],
-                'Time': event['time'],
-                'Location': event['location'],
-                'Description': event['description'],
-                'Event Type': event['event_type'],
-                'Image URL': event['image_url'],
-                'Event URL': event['event_url'],
-                'Scraped At': event['scraped_at']
-            }
-            flattened_events.append(flat_event)
-        
-        return pd.DataFrame(flattened_events)
+        return df[list(EXPORT_COLUMNS)].rename(columns=EXPORT_COLUMNS)
+    
+    def _clean_text_column(self, column):
+        """Collapse whitespace and trim, computed once per distinct value"""
+        column = column.where(_truthy(column), '').astype(object)
+        codes, uniques = pd.factorize(column)
+        cleaned = pd.Series(uniques, dtype=object).astype(str).str.replace(r'\s+', ' ', regex=True).str.strip()
+        return pd.Series(cleaned.to_numpy(dtype=object)[codes], index=column.index)
+    
+    def _extract_ai_info_column(self, analyses):
+        """_extract_ai_info over a column; validated results are taken as-is"""
+        return pd.Series(
+            [self._extract_ai_info(a) if isinstance(a, dict) else {} for a in analyses],
+            index=analyses.index, dtype=object
+        )
+    
+    def report(self):
+        """Print how the AI results were read"""
+        stats = self.ai_stats
+        print(f"AI details: {stats['structured']} validated, {stats['parsed']} parsed from text, "
+              f"{stats['malformed']} malformed")
 
 if __name__ == "__main__":
     processor = EventDataProcessor()
@@ -0,0 +1,174 @@
+"""
+Turn scraped and AI-extracted date/time text into typed start values.
+
+Handles the shapes seen on Facebook and in poster analysis, e.g.
+"2024-03-03", "3/3/2024", "March 3, 2024", "Sat, Mar 3 at 7 PM",
+"Tomorrow at 7:30pm", "19:00". Dates without a year are placed relative to
+the day the event was scraped. Parsing is memoized on the raw strings, since
+the same text repeats across events and scrapes.
+"""
+
+import math
+import re
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from config import DATE_CACHE_SIZE
+
+MONTHS = {name: number for number, name in enumerate(
+    ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec'], 1
+)}
+WEEKDAYS = {name: number for number, name in enumerate(['mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun'])}
+
+_MONTH = (r'(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)'
+          r'(?:uary|ruary|ch|il|e|y|ust|t|tember|ober|ember)?\.?')
+_DAY = r'(\d{1,2})(?:st|nd|rd|th)?'
+_YEAR = r'(?:,?\s+(\d{4}))?'
+
+ISO_DATE_RE = re.compile(r'\b(\d{4})-(\d{1,2})-(\d{1,2})')
+NUMERIC_DATE_RE = re.compile(r'\b(\d{1,2})/(\d{1,2})(?:/(\d{4}|\d{2}))?\b')
+MONTH_DAY_RE = re.compile(rf'\b{_MONTH}\s+{_DAY}\b{_YEAR}')
+DAY_MONTH_RE = re.compile(rf'\b{_DAY}\s+{_MONTH}{_YEAR}')
+RELATIVE_RE = re.compile(r'\b(today|tonight|tomorrow)\b')
+WEEKDAY_RE = re.compile(r'\b(mon|tue|wed|thu|fri|sat|sun)(?:day|s|sday|nesday|rs|rsday|urday)?\b')
+# "7-10pm": the bare start hour of a range takes the end's meridiem
+TIME_RE = re.compile(
+    r'(?<![\d:/-])(\d{1,2})(?::([0-5]\d))?\s*(?:-|–|—|to)\s*(\d{1,2})(?::[0-5]\d)?\s*([ap])\.?\s?m\b\.?'
+    r'|\b(noon)\b|\b(midnight)\b'
+    r'|(?<![\d:])(?:(\d{1,2})(?::([0-5]\d))?\s*([ap])\.?\s?m\b\.?|([01]?\d|2[0-3]):([0-5]\d))'
+)
+
+# A month/day more than this far before the scrape day is taken to be next year's
+PAST_DATE_GRACE = timedelta(days=60)
+
+def _as_text(value):
+    """Strip a raw cell value to text; None and NaN become ''"""
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ''
+    return re.sub(r'\s+', ' ', str(value)).strip().lower()
+
+def _reference_day(reference):
+    """The day relative dates are resolved against: an ISO timestamp, a date, or today"""
+    if isinstance(reference, datetime):
+        return reference.date()
+    if isinstance(reference, date):
+        return reference
+    if isinstance(reference, str) and reference:
+        try:
+            return datetime.fromisoformat(reference[:19]).date()
+        except ValueError:
+            pass
+    return date.today()
+
+def _build_date(year, month, day, reference_day):
+    """A date, guessing the year from the reference day when it is missing"""
+    try:
+        if year is not None:
+            return date(year, month, day)
+        candidate = date(reference_day.year, month, day)
+        if candidate < reference_day - PAST_DATE_GRACE:
+            candidate = date(reference_day.year + 1, month, day)
+        return candidate
+    except ValueError:
+        return None
+
+def _parse_year(text):
+    if not text:
+        return None
+    year = int(text)
+    return year + 2000 if year < 100 else year
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def parse_date_text(text, reference_day):
+    """The calendar date named in lowercased text, or None"""
+    match = ISO_DATE_RE.search(text)
+    if match:
+        return _build_date(int(match.group(1)), int(match.group(2)), int(match.group(3)), reference_day)
+
+    match = NUMERIC_DATE_RE.search(text)
+    if match:
+        first, second = int(match.group(1)), int(match.group(2))
+        # US month/day unless that cannot be a month
+        month, day = (second, first) if first > 12 >= second else (first, second)
+        return _build_date(_parse_year(match.group(3)), month, day, reference_day)
+
+    for pattern, month_group, day_group in ((MONTH_DAY_RE, 1, 2), (DAY_MONTH_RE, 2, 1)):
+        match = pattern.search(text)
+        if match:
+            return _build_date(_parse_year(match.group(3)), MONTHS[match.group(month_group)],
+                               int(match.group(day_group)), reference_day)
+
+    match = RELATIVE_RE.search(text)
+    if match:
+        return reference_day + timedelta(days=1 if match.group(1) == 'tomorrow' else 0)
+
+    match = WEEKDAY_RE.search(text)
+    if match:
+        days_ahead = (WEEKDAYS[match.group(1)] - reference_day.weekday()) % 7
+        return reference_day + timedelta(days=days_ahead)
+
+    return None
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def parse_time_text(text):
+    """The first clock time in lowercased text as 'HH:MM', or None"""
+    match = TIME_RE.search(text)
+    if not match:
+        return None
+    (range_hour, range_minute, range_end, range_meridiem,
+     noon, midnight, hour12, minute12, meridiem, hour24, minute24) = match.groups()
+    if range_hour is not None:
+        hour12, minute12, meridiem = range_hour, range_minute, range_meridiem
+        # "11-2pm" starts in the morning
+        if int(hour12) % 12 > int(range_end) % 12:
+            meridiem = 'a' if meridiem == 'p' else 'p'
+    if noon:
+        return '12:00'
+    if midnight:
+        return '00:00'
+    if hour24 is not None:
+        return f"{int(hour24):02d}:{minute24}"
+
+    hour = int(hour12)
+    if not 1 <= hour <= 12:
+        return None
+    hour = hour % 12 + (12 if meridiem == 'p' else 0)
+    return f"{hour:02d}:{minute12 or '00'}"
+
+def normalize_start(date_value, time_value='', reference=None):
+    """Typed start columns for an event.
+
+    Returns {'start_at', 'start_date', 'start_time', 'all_day'}: an ISO
+    datetime (midnight for all-day events), the ISO date, 'HH:MM' or None,
+    and whether no time was found. Every value is None when there is no
+    recognizable date.
+    """
+    date_text = _as_text(date_value)
+    start_date = parse_date_text(date_text, _reference_day(reference)) if date_text else None
+    if start_date is None:
+        return {'start_at': None, 'start_date': None, 'start_time': None, 'all_day': None}
+
+    time_text = _as_text(time_value)
+    # "Sat, Mar 3 at 7 PM" carries its time in the date text
+    start_time = parse_time_text(time_text) if time_text else None
+    if start_time is None:
+        start_time = parse_time_text(date_text)
+
+    start_at = f"{start_date.isoformat()}T{start_time or '00:00'}:00"
+    return {
+        'start_at': start_at,
+        'start_date': start_date.isoformat(),
+        'start_time': start_time,
+        'all_day': start_time is None
+    }
+
+def cache_info():
+    """Hit/miss counters of the date and time parsers"""
+    return {'date': parse_date_text.cache_info(), 'time': parse_time_text.cache_info()}
+
+if __name__ == "__main__":
+    for sample in ['2024-03-03', '3/3/2024', 'March 3, 2024', 'Sat, Mar 3 at 7 PM',
+                   'Tomorrow at 7:30pm', 'Friday', 'Sat, Mar 3, 7-10pm', 'Sat, Mar 3, 7 - 10 PM',
+                   'Sat, Mar 3, 11–2pm', 'no date here']:
+        print(f"{sample!r}: {normalize_start(sample, reference='2024-02-28T12:00:00')}")
+    print(normalize_start('Mar 3', '7:30pm', '2024-02-28T12:00:00'))
+    print(cache_info())
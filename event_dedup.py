@@ -0,0 +1,273 @@
+"""
+Near-duplicate detection for events: reposts, co-hosted copies, and the same
+poster under a slightly different title.
+
+Events are blocked by start date and normalized venue. Within a block,
+candidate pairs come only from locality-sensitive hashing: MinHash bands of
+the title shingles, and bands of a 64-bit perceptual hash of the poster. So
+the work grows with the number of events, not the number of pairs. Candidate
+pairs are verified and merged with union-find into one canonical record per
+cluster.
+"""
+
+import re
+import zlib
+import numpy as np
+from PIL import Image
+from config import (
+    DEDUP_TITLE_SIMILARITY, DEDUP_POSTER_TITLE_SIMILARITY, DEDUP_POSTER_DISTANCE,
+    DEDUP_NUM_PERM, DEDUP_LSH_BANDS
+)
+from event_store import make_event_key
+from date_normalizer import normalize_start
+
+# Fields copied from duplicates into the canonical event when it has none
+MERGED_FIELDS = ['title', 'date', 'time', 'location', 'description', 'image_url', 'local_image_path', 'image_hash']
+
+# Words that do not distinguish one title or venue from another
+TITLE_STOPWORDS = {'a', 'an', 'and', 'at', 'the', 'of', 'in', 'on', 'with', 'for'}
+VENUE_STOPWORDS = {'the', 'at', 'in', 'of', 'nc', 'north', 'carolina', 'greensboro', 'usa'}
+
+# Poster hashes are split into this many bands; two hashes within
+# DEDUP_POSTER_DISTANCE bits always share a band while it is below this count
+POSTER_BANDS = 8
+
+_MINHASH_PRIME = 4294967311  # smallest prime above 2**32
+
+def normalize_title(title):
+    """Lowercase alphanumeric words of a title, without filler words"""
+    return ' '.join(word for word in re.findall(r'[a-z0-9]+', str(title or '').lower()) if word not in TITLE_STOPWORDS)
+
+def normalize_venue(location):
+    """Comparable venue name: first address part, without filler words"""
+    first_part = str(location or '').split(',')[0].lower()
+    return ' '.join(word for word in re.findall(r'[a-z0-9]+', first_part) if word not in VENUE_STOPWORDS)
+
+def title_shingles(title, size=3):
+    """Character shingles of the normalized title"""
+    text = normalize_title(title)
+    if len(text) <= size:
+        return {text} if text else set()
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+def poster_hash(path):
+    """64-bit difference hash of an image, or None if it cannot be read"""
+    try:
+        with Image.open(path) as image:
+            # Let the JPEG decoder scale down while decoding
+            image.draft('L', (64, 64))
+            pixels = list(image.convert('L').resize((9, 8), Image.Resampling.BILINEAR).getdata())
+    except Exception:
+        return None
+
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            bits = (bits << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return bits
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+def _poster_bands(value):
+    width = 64 // POSTER_BANDS
+    mask = (1 << width) - 1
+    return [(value >> (i * width)) & mask for i in range(POSTER_BANDS)]
+
+class MinHasher:
+    """MinHash signatures over string shingles, using numpy for the permutations"""
+
+    def __init__(self, num_perm=DEDUP_NUM_PERM, seed=1):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.a = rng.integers(1, 1 << 32, num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, 1 << 32, num_perm, dtype=np.uint64)
+
+    def signature(self, shingles):
+        if not shingles:
+            return None
+        hashes = np.fromiter((zlib.crc32(s.encode('utf-8')) for s in shingles), dtype=np.uint64, count=len(shingles))
+        return ((hashes[:, None] * self.a + self.b) % _MINHASH_PRIME).min(axis=0)
+
+    @staticmethod
+    def similarity(sig_a, sig_b):
+        """Estimated Jaccard similarity of two signatures"""
+        if sig_a is None or sig_b is None:
+            return 0.0
+        return float(np.count_nonzero(sig_a == sig_b)) / len(sig_a)
+
+class UnionFind:
+    def __init__(self, size):
+        self.parent = list(range(size))
+
+    def find(self, i):
+        while self.parent[i] != i:
+            self.parent[i] = self.parent[self.parent[i]]
+            i = self.parent[i]
+        return i
+
+    def union(self, i, j):
+        root_i, root_j = self.find(i), self.find(j)
+        if root_i != root_j:
+            self.parent[max(root_i, root_j)] = min(root_i, root_j)
+
+class EventDeduplicator:
+    """Find and merge near-duplicate events"""
+
+    def __init__(self, store=None, title_similarity=DEDUP_TITLE_SIMILARITY,
+                 poster_title_similarity=DEDUP_POSTER_TITLE_SIMILARITY,
+                 poster_distance=DEDUP_POSTER_DISTANCE, num_perm=DEDUP_NUM_PERM, bands=DEDUP_LSH_BANDS):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+        self.store = store
+        self.title_similarity = title_similarity
+        self.poster_title_similarity = poster_title_similarity
+        self.poster_distance = poster_distance
+        self.bands = bands
+        self.minhasher = MinHasher(num_perm)
+        self.stats = {'events': 0, 'candidates': 0, 'clusters': 0, 'duplicates': 0}
+        # Canonical events that gained fields from their duplicates, to be written back
+        self.filled = []
+
+    def _block_key(self, event):
+        """Events can only match within the same start date and venue"""
+        start_date = event.get('start_date')
+        if not start_date:
+            return None
+        return (start_date, normalize_venue(event.get('location')))
+
+    def _poster_hashes(self, events):
+        """Poster hash per image_hash, reusing the ones saved in the store"""
+        wanted = {e['image_hash']: e.get('local_image_path') for e in events
+                  if e.get('image_hash') and e.get('local_image_path')}
+        known = self.store.get_poster_hashes(wanted) if self.store else {}
+        computed = {}
+        for image_hash, path in wanted.items():
+            if image_hash not in known:
+                value = poster_hash(path)
+                if value is not None:
+                    computed[image_hash] = value
+        if self.store and computed:
+            self.store.record_poster_hashes(computed)
+        return {**known, **computed}
+
+    def _is_match(self, sig_a, sig_b, poster_a, poster_b):
+        similarity = MinHasher.similarity(sig_a, sig_b)
+        if similarity >= self.title_similarity:
+            return True
+        posters_match = (poster_a is not None and poster_b is not None
+                         and hamming(poster_a, poster_b) <= self.poster_distance)
+        return posters_match and similarity >= self.poster_title_similarity
+
+    def find_clusters(self, events):
+        """Groups of indices into `events` that describe the same event"""
+        posters_by_hash = self._poster_hashes(events)
+        rows = self.minhasher.num_perm // self.bands
+
+        signatures, posters, buckets = [], [], {}
+        for i, event in enumerate(events):
+            block = self._block_key(event)
+            signature = self.minhasher.signature(title_shingles(event.get('title'))) if block else None
+            poster = posters_by_hash.get(event.get('image_hash')) if block else None
+            signatures.append(signature)
+            posters.append(poster)
+            if signature is not None:
+                for band in range(self.bands):
+                    key = (block, 't', band, signature[band * rows:(band + 1) * rows].tobytes())
+                    buckets.setdefault(key, []).append(i)
+            if poster is not None:
+                for band, value in enumerate(_poster_bands(poster)):
+                    buckets.setdefault((block, 'p', band, value), []).append(i)
+
+        union_find = UnionFind(len(events))
+        checked = set()
+        for members in buckets.values():
+            for pos, i in enumerate(members):
+                for j in members[pos + 1:]:
+                    if (i, j) in checked or union_find.find(i) == union_find.find(j):
+                        continue
+                    checked.add((i, j))
+                    if self._is_match(signatures[i], signatures[j], posters[i], posters[j]):
+                        union_find.union(i, j)
+
+        clusters = {}
+        for i in range(len(events)):
+            clusters.setdefault(union_find.find(i), []).append(i)
+        self.stats['events'] += len(events)
+        self.stats['candidates'] += len(checked)
+        return [members for members in clusters.values() if len(members) > 1]
+
+    @staticmethod
+    def _canonical_rank(event):
+        """Prefer the event seen first, then the one with the most details"""
+        filled = sum(1 for field in MERGED_FIELDS if event.get(field))
+        return (event.get('first_seen') or '~', -filled, make_event_key(event))
+
+    def dedupe(self, events):
+        """Mark duplicates in place and fill canonical events from them.
+
+        Sets `duplicate_of` to the canonical event key on every duplicate and
+        clears it on canonical events. Canonical events that gained fields are
+        collected in `filled`. Returns {duplicate key: canonical key}.
+        """
+        duplicates = {}
+        for members in self.find_clusters(events):
+            cluster = sorted((events[i] for i in members), key=self._canonical_rank)
+            # Pin keys before filling: a URL-less event's key hashes the fields about to change
+            for event in cluster:
+                event['event_key'] = event.get('event_key') or make_event_key(event)
+            canonical = cluster[0]
+            canonical_key = canonical['event_key']
+            canonical['duplicate_of'] = None
+            filled = set()
+            for duplicate in cluster[1:]:
+                for field in MERGED_FIELDS:
+                    if not canonical.get(field) and duplicate.get(field):
+                        canonical[field] = duplicate[field]
+                        filled.add(field)
+                duplicate['duplicate_of'] = canonical_key
+                duplicates[duplicate['event_key']] = canonical_key
+            if filled & {'date', 'time'}:
+                canonical.update(normalize_start(canonical.get('date'), canonical.get('time'),
+                                                 canonical.get('scraped_at')))
+            if filled:
+                self.filled.append(canonical)
+            self.stats['clusters'] += 1
+        self.stats['duplicates'] += len(duplicates)
+        return duplicates
+
+    def dedupe_with_store(self, events):
+        """Dedupe a batch of new events against each other and stored events on the same dates"""
+        if self.store is None:
+            return self.dedupe(events)
+        batch_keys = {make_event_key(event) for event in events}
+        dates = {event['start_date'] for event in events if event.get('start_date')}
+        archived = [
+            event for event in self.store.fetch_events(start_dates=dates, include_duplicates=True)
+            if event['event_key'] not in batch_keys
+        ] if dates else []
+        return self.dedupe(list(events) + archived)
+
+    def save(self, duplicates, reset=False):
+        """Write duplicate marks and the fields merged into canonical events to the store"""
+        self.store.mark_duplicates(duplicates, reset=reset)
+        if self.filled:
+            self.store.fill_events(self.filled, MERGED_FIELDS)
+    
+    def report(self):
+        stats = self.stats
+        print(f"Dedup: {stats['events']} events, {stats['candidates']} candidate pairs checked, "
+              f"{stats['duplicates']} duplicates in {stats['clusters']} clusters")
+
+if __name__ == "__main__":
+    sample = [
+        {'title': 'Jazz Night at the Carolina Theatre', 'start_date': '2024-03-03', 'location': 'Carolina Theatre, Greensboro, NC',
+         'event_url': 'https://facebook.com/events/1'},
+        {'title': 'Jazz Night @ Carolina Theatre!', 'start_date': '2024-03-03', 'location': 'The Carolina Theatre',
+         'event_url': 'https://facebook.com/events/2'},
+        {'title': 'Farmers Market', 'start_date': '2024-03-03', 'location': 'Carolina Theatre',
+         'event_url': 'https://facebook.com/events/3'}
+    ]
+    deduplicator = EventDeduplicator()
+    print(deduplicator.dedupe(sample))
+    deduplicator.report()
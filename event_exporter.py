@@ -0,0 +1,192 @@
+"""
+Export stored events to the formats downstream consumers read.
+
+All formats are written from one DataFrame loaded once from the event store:
+the styled xlsx for people, and for programs Parquet (columnar, fastest to
+reload), gzip'd CSV, newline-delimited JSON and an RFC 5545 iCalendar feed.
+Every file is written to a temporary name and renamed into place, so readers
+never see a half-written export.
+"""
+
+import hashlib
+import os
+from datetime import datetime, timedelta, timezone
+import pandas as pd
+from config import EXPORT_PATHS, DEFAULT_EXPORT_FORMATS
+from event_store import COLUMN_LABELS
+from spreadsheet_exporter import SpreadsheetExporter
+
+EXPORT_FORMATS = ['xlsx', 'parquet', 'csv', 'ndjson', 'ics']
+
+# Machine-readable columns shared by the parquet/csv/ndjson exports
+EXPORT_FIELDS = [
+    'event_key', 'title', 'date', 'time', 'start_at', 'start_date', 'start_time', 'all_day',
+    'location', 'description', 'event_type', 'image_url', 'event_url', 'local_image_path',
+    'scraped_at', 'first_seen', 'last_seen'
+]
+TEXT_FIELDS = [field for field in EXPORT_FIELDS if field != 'all_day']
+# Typed start columns, None when the event has no recognizable date
+START_FIELDS = ['start_at', 'start_date', 'start_time']
+
+# Formats the web app can load, fastest first
+LOADABLE_FORMATS = ['parquet', 'csv', 'ndjson']
+
+ICS_PRODID = '-//Greensboro Events//Event Calendar//EN'
+ICS_CALENDAR_NAME = 'Greensboro, NC Events'
+
+def parquet_available():
+    """Parquet needs pyarrow or fastparquet"""
+    for engine in ('pyarrow', 'fastparquet'):
+        try:
+            __import__(engine)
+            return True
+        except ImportError:
+            continue
+    return False
+
+def _write_atomic(path, write):
+    """Call write(tmp_path), then move the result over path"""
+    tmp_path = f"{path}.tmp"
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def _ics_escape(text):
+    """Escape a TEXT value (RFC 5545 section 3.3.11)"""
+    return (str(text).replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n').replace('\r', '\\n'))
+
+def _ics_fold(line):
+    """Fold a content line at 75 octets without splitting a UTF-8 character"""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line
+    parts, start, limit = [], 0, 75
+    while start < len(encoded):
+        end = min(start + limit, len(encoded))
+        # Back up to a character boundary
+        while end < len(encoded) and (encoded[end] & 0xC0) == 0x80:
+            end -= 1
+        parts.append(encoded[start:end].decode('utf-8'))
+        start, limit = end, 74  # continuation lines start with a space
+    return '\r\n '.join(parts)
+
+def ics_calendar(events_df, generated_at=None):
+    """iCalendar text for every dated event in the frame"""
+    stamp = (generated_at or datetime.now(timezone.utc)).strftime('%Y%m%dT%H%M%SZ')
+    lines = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        f'PRODID:{ICS_PRODID}',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        f'X-WR-CALNAME:{_ics_escape(ICS_CALENDAR_NAME)}'
+    ]
+    for event in events_df.itertuples(index=False):
+        if not event.start_at:
+            continue
+        start = datetime.fromisoformat(event.start_at)
+        uid = hashlib.sha1(event.event_key.encode('utf-8')).hexdigest()
+        lines += ['BEGIN:VEVENT', f'UID:{uid}@greensboro-events', f'DTSTAMP:{stamp}']
+        if event.all_day:
+            lines += [f"DTSTART;VALUE=DATE:{start:%Y%m%d}",
+                      f"DTEND;VALUE=DATE:{start + timedelta(days=1):%Y%m%d}"]
+        else:
+            # Floating local time: the events are all in Greensboro
+            lines.append(f"DTSTART:{start:%Y%m%dT%H%M%S}")
+        lines.append(f"SUMMARY:{_ics_escape(event.title)}")
+        for name, value in (('LOCATION', event.location), ('DESCRIPTION', event.description),
+                            ('CATEGORIES', event.event_type)):
+            if value:
+                lines.append(f"{name}:{_ics_escape(value)}")
+        if event.event_url:
+            lines.append(f"URL:{event.event_url}")
+        lines.append('END:VEVENT')
+    lines.append('END:VCALENDAR')
+    return ''.join(_ics_fold(line) + '\r\n' for line in lines)
+
+class EventExporter:
+    """Write the stored events to any combination of EXPORT_FORMATS"""
+
+    def __init__(self, paths=None):
+        self.paths = dict(EXPORT_PATHS, **(paths or {}))
+
+    def frame(self, events):
+        """One typed DataFrame from EventStore.fetch_events() rows"""
+        df = pd.DataFrame(events, columns=EXPORT_FIELDS)
+        df[TEXT_FIELDS] = df[TEXT_FIELDS].astype(object).where(df[TEXT_FIELDS].notna(), None)
+        df['all_day'] = df['all_day'].astype('boolean')
+        return df
+
+    def export(self, events, formats=DEFAULT_EXPORT_FORMATS):
+        """Export in every requested format; returns {format: path}"""
+        unknown = set(formats) - set(EXPORT_FORMATS)
+        if unknown:
+            raise ValueError(f"Unknown export formats: {', '.join(sorted(unknown))}")
+        if 'parquet' in formats and not parquet_available():
+            raise ValueError("Parquet export needs pyarrow (pip install pyarrow)")
+
+        df = self.frame(events)
+        written = {}
+        for fmt in EXPORT_FORMATS:
+            if fmt not in formats:
+                continue
+            path = self.paths[fmt]
+            getattr(self, f"_write_{fmt}")(df, path)
+            written[fmt] = path
+        return written
+
+    def _write_xlsx(self, df, path):
+        labeled = df[list(COLUMN_LABELS)].rename(columns=COLUMN_LABELS)
+        # Quiet: the caller reports the final path, not the temporary one
+        _write_atomic(path, lambda tmp: SpreadsheetExporter(tmp).export_events(labeled, verbose=False))
+
+    def _write_parquet(self, df, path):
+        _write_atomic(path, lambda tmp: df.to_parquet(tmp, index=False))
+
+    def _write_csv(self, df, path):
+        _write_atomic(path, lambda tmp: df.to_csv(tmp, index=False, compression='gzip'))
+
+    def _write_ndjson(self, df, path):
+        _write_atomic(path, lambda tmp: df.to_json(tmp, orient='records', lines=True, force_ascii=False))
+
+    def _write_ics(self, df, path):
+        calendar = ics_calendar(df)
+
+        def write(tmp):
+            # newline='' keeps the CRLF line endings RFC 5545 requires
+            with open(tmp, 'w', encoding='utf-8', newline='') as f:
+                f.write(calendar)
+        _write_atomic(path, write)
+
+def read_events(fmt, path):
+    """Load an export written by EventExporter as event dicts, with typed values restored"""
+    if fmt == 'parquet':
+        df = pd.read_parquet(path)
+    elif fmt == 'csv':
+        df = pd.read_csv(path, dtype={field: str for field in TEXT_FIELDS}, keep_default_na=False,
+                         compression='gzip')
+    elif fmt == 'ndjson':
+        # convert_dates=False keeps start_at/first_seen as the ISO strings that were written
+        df = pd.read_json(path, orient='records', lines=True, dtype={field: str for field in TEXT_FIELDS},
+                          convert_dates=False)
+    else:
+        raise ValueError(f"Cannot load events from {fmt}")
+
+    df = df.reindex(columns=EXPORT_FIELDS)
+    df[TEXT_FIELDS] = df[TEXT_FIELDS].astype(object).where(df[TEXT_FIELDS].notna(), '')
+    events = df.to_dict('records')
+    for event in events:
+        for field in START_FIELDS:
+            event[field] = event[field] or None
+        event['all_day'] = _read_flag(event['all_day'])
+    return events
+
+def _read_flag(value):
+    """all_day as written by any export: bool, 0/1, 'True'/'False', or missing"""
+    if value is None or value is pd.NA or value == '' or (isinstance(value, float) and pd.isna(value)):
+        return None
+    return str(value).strip().lower() in ('1', '1.0', 'true')
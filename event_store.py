@@ -0,0 +1,393 @@
+import sqlite3
+import threading
+import hashlib
+import json
+import os
+from datetime import datetime
+from urllib.parse import urlsplit, urlunsplit
+from config import EVENT_DB_PATH
+from date_normalizer import normalize_start
+
+def _backfill_start_columns(conn):
+    """Recompute the typed start columns of stored events from their date text"""
+    rows = conn.execute('SELECT event_key, date, time, scraped_at FROM events').fetchall()
+    conn.executemany(
+        """
+        UPDATE events SET start_at = :start_at, start_date = :start_date,
+                          start_time = :start_time, all_day = :all_day
+        WHERE event_key = :event_key
+        """,
+        [dict(normalize_start(row['date'], row['time'], row['scraped_at']), event_key=row['event_key'])
+         for row in rows]
+    )
+
+# Schema migrations, applied in order and tracked with PRAGMA user_version.
+# Entries are SQL scripts or callables taking the connection.
+# Append new entries; never edit one that has already shipped.
+MIGRATIONS = [
+    """
+    CREATE TABLE IF NOT EXISTS events (
+        event_key TEXT PRIMARY KEY,
+        event_url TEXT NOT NULL DEFAULT '',
+        title TEXT NOT NULL DEFAULT '',
+        date TEXT NOT NULL DEFAULT '',
+        time TEXT NOT NULL DEFAULT '',
+        start_at TEXT,
+        location TEXT NOT NULL DEFAULT '',
+        description TEXT NOT NULL DEFAULT '',
+        event_type TEXT NOT NULL DEFAULT 'Unknown',
+        image_url TEXT NOT NULL DEFAULT '',
+        local_image_path TEXT NOT NULL DEFAULT '',
+        ai_extracted_info TEXT NOT NULL DEFAULT '{}',
+        scraped_at TEXT NOT NULL DEFAULT '',
+        first_seen TEXT NOT NULL,
+        last_seen TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_events_start_at ON events(start_at);
+    CREATE INDEX IF NOT EXISTS idx_events_event_type ON events(event_type);
+    CREATE INDEX IF NOT EXISTS idx_events_event_url ON events(event_url);
+
+    CREATE TABLE IF NOT EXISTS meta (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    );
+    INSERT OR IGNORE INTO meta (key, value) VALUES ('data_version', '0');
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS images (
+        image_url TEXT PRIMARY KEY,
+        sha256 TEXT NOT NULL,
+        path TEXT NOT NULL,
+        etag TEXT NOT NULL DEFAULT '',
+        last_modified TEXT NOT NULL DEFAULT '',
+        fetched_at TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_images_sha256 ON images(sha256);
+    ALTER TABLE events ADD COLUMN image_hash TEXT NOT NULL DEFAULT '';
+    """,
+    """
+    ALTER TABLE events ADD COLUMN fingerprint TEXT NOT NULL DEFAULT '';
+    """,
+    """
+    ALTER TABLE events ADD COLUMN start_date TEXT;
+    ALTER TABLE events ADD COLUMN start_time TEXT;
+    ALTER TABLE events ADD COLUMN all_day INTEGER;
+    CREATE INDEX IF NOT EXISTS idx_events_start_date ON events(start_date);
+    """,
+    _backfill_start_columns,
+    """
+    ALTER TABLE events ADD COLUMN duplicate_of TEXT;
+    CREATE INDEX IF NOT EXISTS idx_events_duplicate_of ON events(duplicate_of);
+
+    CREATE TABLE IF NOT EXISTS poster_hashes (
+        sha256 TEXT PRIMARY KEY,
+        dhash TEXT NOT NULL
+    );
+    """
+]
+
+# Typed columns derived from the date/time text by date_normalizer
+START_COLUMNS = ['start_at', 'start_date', 'start_time', 'all_day']
+
+# Text columns where an empty incoming value should not erase what we already have
+_MERGED_COLUMNS = [
+    'event_url', 'title', 'date', 'time', 'location', 'description',
+    'image_url', 'local_image_path', 'image_hash', 'fingerprint', 'scraped_at'
+]
+
+UPSERT_SQL = f"""
+    INSERT INTO events (
+        event_key, event_url, title, date, time, start_at, start_date, start_time, all_day,
+        location, description,
+        event_type, image_url, local_image_path, image_hash, fingerprint, ai_extracted_info,
+        scraped_at, first_seen, last_seen
+    ) VALUES (
+        :event_key, :event_url, :title, :date, :time, :start_at, :start_date, :start_time, :all_day,
+        :location, :description,
+        :event_type, :image_url, :local_image_path, :image_hash, :fingerprint, :ai_extracted_info,
+        :scraped_at,
+        :seen_at, :seen_at
+    )
+    ON CONFLICT(event_key) DO UPDATE SET
+        {', '.join(f"{col} = COALESCE(NULLIF(excluded.{col}, ''), events.{col})" for col in _MERGED_COLUMNS)},
+        {', '.join(f"{col} = CASE WHEN excluded.start_at IS NULL THEN events.{col} ELSE excluded.{col} END"
+                   for col in START_COLUMNS)},
+        event_type = CASE WHEN excluded.event_type = 'Unknown' THEN events.event_type
+                          ELSE excluded.event_type END,
+        ai_extracted_info = CASE WHEN excluded.ai_extracted_info = '{{}}' THEN events.ai_extracted_info
+                                 ELSE excluded.ai_extracted_info END,
+        last_seen = excluded.last_seen
+"""
+
+# Spreadsheet column labels, in export order
+COLUMN_LABELS = {
+    'title': 'Title',
+    'date': 'Date',
+    'time': 'Time',
+    'location': 'Location',
+    'description': 'Description',
+    'event_type': 'Event Type',
+    'image_url': 'Image URL',
+    'event_url': 'Event URL',
+    'scraped_at': 'Scraped At'
+}
+
+def normalize_event_url(url):
+    """Reduce an event URL to a stable form (no query string, fragment or mobile host)"""
+    if not url:
+        return ''
+    parts = urlsplit(str(url).strip())
+    host = parts.netloc.lower()
+    for prefix in ('www.', 'm.', 'web.'):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+            break
+    path = parts.path.rstrip('/') or '/'
+    return urlunsplit(((parts.scheme or 'https').lower(), host, path, '', ''))
+
+def make_event_key(event):
+    """Primary key for an event: its normalized URL, or a hash of its descriptive fields"""
+    url = normalize_event_url(event.get('event_url'))
+    if url:
+        return url
+    digest = hashlib.sha1(
+        '|'.join(str(event.get(field) or '') for field in ('title', 'date', 'time', 'location')).encode('utf-8')
+    ).hexdigest()
+    return f"untracked:{digest}"
+
+def event_fingerprint(event):
+    """Hash of the scraped fields that matter; changes when an event is edited"""
+    # Facebook CDN image URLs carry rotating signature params, so only the path counts
+    image_path = urlsplit(str(event.get('image_url') or '')).path
+    parts = [make_event_key(event), str(event.get('title') or ''), str(event.get('date') or ''), image_path]
+    return hashlib.sha1('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+class EventStore:
+    """SQLite-backed event history shared by the scraper and the web app"""
+
+    def __init__(self, db_path=EVENT_DB_PATH):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._migrate()
+
+    def _connect(self):
+        """Return this thread's connection, reopening it after a fork"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            # WAL lets the web app read while a scrape is writing
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _migrate(self):
+        """Bring the database schema up to date"""
+        conn = self._connect()
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        for number, script in enumerate(MIGRATIONS[version:], version + 1):
+            if callable(script):
+                script(conn)
+            else:
+                conn.executescript(script)
+            conn.execute(f'PRAGMA user_version = {number}')
+            conn.commit()
+
+    def _bump_version(self, conn):
+        conn.execute(
+            "UPDATE meta SET value = CAST(value AS INTEGER) + 1 WHERE key = 'data_version'"
+        )
+
+    def data_version(self):
+        """Monotonic counter that changes every time events are written"""
+        row = self._connect().execute(
+            "SELECT value FROM meta WHERE key = 'data_version'"
+        ).fetchone()
+        return int(row['value']) if row else 0
+
+    def _to_row(self, event, seen_at):
+        """Map a processed event dict to upsert parameters"""
+        row = {col: str(event.get(col) or '') for col in _MERGED_COLUMNS}
+        row['event_url'] = normalize_event_url(event.get('event_url')) or row['event_url']
+        # Keep a key assigned earlier (e.g. by dedup) even if the fields it hashes were filled since
+        row['event_key'] = event.get('event_key') or make_event_key(event)
+        if 'start_at' in event:
+            row.update({col: event.get(col) for col in START_COLUMNS})
+        else:
+            row.update(normalize_start(row['date'], row['time'], row['scraped_at']))
+        row['event_type'] = event.get('event_type') or 'Unknown'
+        row['ai_extracted_info'] = json.dumps(event.get('ai_extracted_info') or {})
+        row['seen_at'] = seen_at
+        return row
+
+    def upsert_events(self, events):
+        """Insert new events and update existing ones, keeping their history"""
+        seen_at = datetime.now().isoformat()
+        rows = [self._to_row(event, seen_at) for event in events]
+        if not rows:
+            return 0
+
+        conn = self._connect()
+        with conn:
+            conn.executemany(UPSERT_SQL, rows)
+            self._bump_version(conn)
+        return len(rows)
+
+    def fetch_events(self, start=None, end=None, event_type=None, start_dates=None, include_duplicates=False):
+        """Return stored events as dicts ordered by start time"""
+        clauses, params = [], []
+        if not include_duplicates:
+            clauses.append('duplicate_of IS NULL')
+        if start_dates is not None:
+            start_dates = list(start_dates)
+            clauses.append(f"start_date IN ({', '.join('?' * len(start_dates))})")
+            params.extend(start_dates)
+        if start:
+            clauses.append('start_at >= ?')
+            params.append(start.isoformat())
+        if end:
+            clauses.append('start_at < ?')
+            params.append(end.isoformat())
+        if event_type:
+            clauses.append('event_type = ?')
+            params.append(event_type)
+
+        sql = 'SELECT * FROM events'
+        if clauses:
+            sql += ' WHERE ' + ' AND '.join(clauses)
+        sql += ' ORDER BY start_at, title'
+
+        rows = self._connect().execute(sql, params).fetchall()
+        return [dict(row) for row in rows]
+
+    def count_events(self):
+        return self._connect().execute('SELECT COUNT(*) FROM events WHERE duplicate_of IS NULL').fetchone()[0]
+
+    def mark_duplicates(self, duplicates, reset=False):
+        """Point duplicate events at their canonical event, given {duplicate key: canonical key}.
+
+        Canonical events are unmarked; with reset, every other mark is cleared first.
+        """
+        conn = self._connect()
+        with conn:
+            if reset:
+                conn.execute('UPDATE events SET duplicate_of = NULL WHERE duplicate_of IS NOT NULL')
+            conn.executemany(
+                'UPDATE events SET duplicate_of = NULL WHERE event_key = ?',
+                [(key,) for key in set(duplicates.values())]
+            )
+            conn.executemany(
+                'UPDATE events SET duplicate_of = ? WHERE event_key = ?',
+                [(canonical, key) for key, canonical in duplicates.items()]
+            )
+            self._bump_version(conn)
+
+    def fill_events(self, events, fields):
+        """Fill the empty `fields` of stored events from the given event dicts, then re-derive their starts"""
+        keys = [event.get('event_key') or make_event_key(event) for event in events]
+        conn = self._connect()
+        with conn:
+            for field in fields:
+                conn.executemany(
+                    f"UPDATE events SET {field} = ? WHERE event_key = ? AND COALESCE({field}, '') = ''",
+                    [(str(event[field]), key) for event, key in zip(events, keys) if event.get(field)]
+                )
+            # A filled date or time changes the typed start columns
+            rows = []
+            for key in keys:
+                row = conn.execute(
+                    'SELECT date, time, scraped_at FROM events WHERE event_key = ?', (key,)
+                ).fetchone()
+                if row is not None:
+                    start = normalize_start(row['date'], row['time'], row['scraped_at'])
+                    rows.append(dict(start, event_key=key))
+            conn.executemany(
+                f"UPDATE events SET {', '.join(f'{col} = :{col}' for col in START_COLUMNS)} WHERE event_key = :event_key",
+                rows
+            )
+            self._bump_version(conn)
+
+    def get_fingerprints(self):
+        """Map of event key to the fingerprint stored on its last scrape"""
+        rows = self._connect().execute(
+            "SELECT event_key, fingerprint FROM events WHERE fingerprint != ''"
+        ).fetchall()
+        return {row['event_key']: row['fingerprint'] for row in rows}
+
+    def touch_events(self, event_keys):
+        """Mark unchanged events as seen again without rewriting them"""
+        seen_at = datetime.now().isoformat()
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                'UPDATE events SET last_seen = ? WHERE event_key = ?',
+                [(seen_at, key) for key in event_keys]
+            )
+
+    def get_poster_hashes(self, image_hashes):
+        """Saved perceptual hashes for the given image content hashes"""
+        found = {}
+        image_hashes = list(image_hashes)
+        # Stay under SQLite's bound-parameter limit
+        for i in range(0, len(image_hashes), 500):
+            chunk = image_hashes[i:i + 500]
+            rows = self._connect().execute(
+                f"SELECT sha256, dhash FROM poster_hashes WHERE sha256 IN ({', '.join('?' * len(chunk))})", chunk
+            ).fetchall()
+            found.update({row['sha256']: int(row['dhash'], 16) for row in rows})
+        return found
+
+    def record_poster_hashes(self, hashes):
+        """Save perceptual hashes, given {image content hash: 64-bit int}"""
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO poster_hashes (sha256, dhash) VALUES (?, ?)',
+                [(sha256, f"{value:016x}") for sha256, value in hashes.items()]
+            )
+
+    def get_image(self, image_url):
+        """Return the image index entry for a URL, or None"""
+        # Keyed like event URLs: CDN links carry signatures that change on every scrape
+        row = self._connect().execute(
+            'SELECT * FROM images WHERE image_url = ?', (normalize_event_url(image_url),)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def record_image(self, image_url, sha256, path, etag='', last_modified=''):
+        """Remember where a URL's content is stored and its validators for conditional requests"""
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                """
+                INSERT INTO images (image_url, sha256, path, etag, last_modified, fetched_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(image_url) DO UPDATE SET
+                    sha256 = excluded.sha256,
+                    path = excluded.path,
+                    etag = excluded.etag,
+                    last_modified = excluded.last_modified,
+                    fetched_at = excluded.fetched_at
+                """,
+                (normalize_event_url(image_url), sha256, path, etag or '', last_modified or '',
+                 datetime.now().isoformat())
+            )
+
+    def referenced_image_paths(self):
+        """Paths of image files that at least one stored event points to"""
+        rows = self._connect().execute(
+            """
+            SELECT local_image_path AS path FROM events WHERE local_image_path != ''
+            UNION
+            SELECT images.path FROM images JOIN events ON events.image_hash = images.sha256
+            """
+        ).fetchall()
+        return {os.path.normpath(row['path']) for row in rows}
+
+    def forget_images(self, paths):
+        """Drop image index entries whose files were deleted"""
+        conn = self._connect()
+        with conn:
+            conn.executemany('DELETE FROM images WHERE path = ?', [(path,) for path in paths])
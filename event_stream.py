@@ -0,0 +1,76 @@
+"""
+Versioned deltas between calendar snapshots, and their Server-Sent Events framing.
+
+Every rebuild of the calendar data records what changed since the previous
+version, keyed by the events' stable ids (their event keys). A client that
+reports the version it shows gets back the merged delta, or None when that
+version is too old, in which case it must reload everything.
+"""
+
+import json
+import threading
+from collections import deque
+from config import SSE_DELTA_HISTORY
+
+def diff_events(old_events, new_events):
+    """Return {'added', 'changed', 'removed'} between two lists of calendar events with ids"""
+    old = {event['id']: event for event in old_events}
+    new = {event['id']: event for event in new_events}
+    return {
+        'added': [event for key, event in new.items() if key not in old],
+        'changed': [event for key, event in new.items() if key in old and old[key] != event],
+        'removed': [key for key in old if key not in new]
+    }
+
+def merge_deltas(deltas):
+    """Collapse consecutive deltas into one that takes the oldest version to the newest"""
+    added, changed, removed = {}, {}, set()
+    for delta in deltas:
+        for event in delta['added']:
+            if event['id'] in removed:
+                # Removed and re-added: the client still has the old copy
+                removed.discard(event['id'])
+                changed[event['id']] = event
+            else:
+                added[event['id']] = event
+        for event in delta['changed']:
+            (added if event['id'] in added else changed)[event['id']] = event
+        for key in delta['removed']:
+            if added.pop(key, None) is None:
+                changed.pop(key, None)
+                removed.add(key)
+    return {'added': list(added.values()), 'changed': list(changed.values()), 'removed': sorted(removed)}
+
+class DeltaLog:
+    """Bounded, thread-safe history of (from_version, to_version, delta)"""
+
+    def __init__(self, maxlen=SSE_DELTA_HISTORY):
+        self._entries = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+
+    def record(self, from_version, to_version, delta):
+        with self._lock:
+            self._entries.append((from_version, to_version, delta))
+
+    def since(self, version, current):
+        """Merged delta from `version` to `current`, or None if the history no longer reaches back that far"""
+        if version == current:
+            return {'added': [], 'changed': [], 'removed': []}
+        with self._lock:
+            entries = list(self._entries)
+        for start, (from_version, _, _) in enumerate(entries):
+            if from_version == version:
+                chain = entries[start:]
+                if chain[-1][1] != current:
+                    return None
+                return merge_deltas(delta for _, _, delta in chain)
+        return None
+
+def sse_message(event, data, event_id=None):
+    """Encode one Server-Sent Events message"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False, separators=(',', ':'))}")
+    return '\n'.join(lines) + '\n\n'
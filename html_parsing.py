@@ -0,0 +1,123 @@
+"""
+HTML parsing backends for extracting event cards from saved or live pages.
+
+selectolax is used when installed, then BeautifulSoup with lxml, then
+BeautifulSoup with the pure-Python html.parser. Every backend returns the
+same records: {'title', 'image_url', 'href'} per card.
+"""
+
+from bs4 import BeautifulSoup
+import soupsieve
+from config import PARSER_BACKEND
+
+try:
+    from selectolax.lexbor import LexborHTMLParser as HTMLParser
+except ImportError:
+    try:
+        # selectolax < 0.3.13 only ships the Modest engine
+        from selectolax.parser import HTMLParser
+    except ImportError:
+        HTMLParser = None
+
+try:
+    import lxml  # noqa: F401  (only needed as a BeautifulSoup feature)
+    HAVE_LXML = True
+except ImportError:
+    HAVE_LXML = False
+
+CARD_SELECTOR = 'div[role="article"]'
+TITLE_SELECTORS = ('a[role="link"]', 'h3')
+IMAGE_SELECTOR = 'img'
+LINK_SELECTOR = 'a[href]'
+
+def collapse_whitespace(text):
+    """Title text as every extraction path reports it: whitespace runs collapsed, ends trimmed.
+
+    Matches `textContent.replace(/\\s+/g, ' ').trim()` in the scraper's in-page
+    extraction, so event keys and fingerprints do not depend on the path.
+    """
+    return ' '.join(text.split())
+
+def _is_event_class(class_name):
+    """Fallback card match used when the page has no role=article cards"""
+    return bool(class_name) and 'event' in class_name.lower()
+
+class SoupBackend:
+    """BeautifulSoup with precompiled soupsieve selectors"""
+
+    def __init__(self, features):
+        self.name = features
+        self.features = features
+        self.cards = soupsieve.compile(CARD_SELECTOR)
+        self.titles = [soupsieve.compile(selector) for selector in TITLE_SELECTORS]
+        self.image = soupsieve.compile(IMAGE_SELECTOR)
+        self.link = soupsieve.compile(LINK_SELECTOR)
+
+    def extract_cards(self, html):
+        soup = BeautifulSoup(html, self.features)
+        cards = self.cards.select(soup)
+        if not cards:
+            cards = soup.find_all('div', class_=lambda x: _is_event_class(x))
+
+        records = []
+        for card in cards:
+            title_elem = None
+            for selector in self.titles:
+                title_elem = selector.select_one(card)
+                if title_elem:
+                    break
+            img_elem = self.image.select_one(card)
+            link_elem = self.link.select_one(card)
+            records.append({
+                'title': collapse_whitespace(title_elem.get_text()) if title_elem else '',
+                'image_url': (img_elem.get('src') or '') if img_elem else '',
+                'href': link_elem['href'] if link_elem else ''
+            })
+        return records
+
+class SelectolaxBackend:
+    """selectolax (Lexbor, or Modest on old versions) with CSS queries"""
+
+    name = 'selectolax'
+
+    def extract_cards(self, html):
+        tree = HTMLParser(html)
+        cards = tree.css(CARD_SELECTOR)
+        if not cards:
+            cards = [node for node in tree.css('div[class]') if _is_event_class(node.attributes.get('class'))]
+
+        records = []
+        for card in cards:
+            title_elem = None
+            for selector in TITLE_SELECTORS:
+                title_elem = card.css_first(selector)
+                if title_elem:
+                    break
+            img_elem = card.css_first(IMAGE_SELECTOR)
+            link_elem = card.css_first(LINK_SELECTOR)
+            records.append({
+                'title': collapse_whitespace(title_elem.text(deep=True, separator='')) if title_elem else '',
+                'image_url': (img_elem.attributes.get('src') or '') if img_elem else '',
+                'href': (link_elem.attributes.get('href') or '') if link_elem else ''
+            })
+        return records
+
+def available_backends():
+    """Names of the backends usable in this environment, fastest first"""
+    names = []
+    if HTMLParser is not None:
+        names.append('selectolax')
+    if HAVE_LXML:
+        names.append('lxml')
+    names.append('html.parser')
+    return names
+
+def get_backend(name=PARSER_BACKEND):
+    """Return a parser backend by name, or the fastest available one for 'auto'"""
+    if name == 'auto':
+        name = available_backends()[0]
+    if name not in available_backends():
+        raise ValueError(f"Parser backend '{name}' is not available (have: {', '.join(available_backends())})")
+    if name == 'selectolax':
+        return SelectolaxBackend()
+    return SoupBackend(name)
@@ -1,61 +1,228 @@
 import openai
 from PIL import Image
 import base64
+import hashlib
 import io
 import os
-from config import OPENAI_API_KEY
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from config import (
+    OPENAI_API_KEY, OPENAI_BASE_URL, OPENAI_VISION_MODEL, ANALYSIS_PROMPT_VERSION,
+    ANALYSIS_CONCURRENCY, ANALYSIS_REQUESTS_PER_MINUTE, ANALYSIS_TOKENS_PER_MINUTE,
+    ANALYSIS_ESTIMATED_TOKENS, ANALYSIS_MAX_RETRIES,
+    POSTER_MAX_EDGE, POSTER_FORMAT, POSTER_QUALITY
+)
+from analysis_cache import AnalysisCache
+from analysis_schema import RESPONSE_FORMAT, MalformedAnalysis, parse_analysis
+from image_downloader import DERIVED_MARKER, TEMP_PREFIX
+from rate_limiter import RateLimiter
+
+ANALYSIS_PROMPT = """Analyze this event poster and extract the following information as a JSON object:
+                                {
+                                    "event_name": "extracted event name",
+                                    "date": "extracted date",
+                                    "time": "extracted time",
+                                    "location": "extracted venue/location",
+                                    "description": "brief description of the event",
+                                    "event_type": "category like concert, meetup, festival, etc.",
+                                    "key_details": ["list", "of", "important", "details"]
+                                }
+                                If any information is not clearly visible, use null for that field."""
+
+def hash_image_file(image_path):
+    """SHA-256 of an image file, matching the names used by the image store"""
+    digest = hashlib.sha256()
+    with open(image_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _retry_after_seconds(error, attempt):
+    """Delay requested by a 429/5xx response, or exponential backoff with jitter"""
+    response = getattr(error, 'response', None)
+    headers = response.headers if response is not None else {}
+    try:
+        if headers.get('retry-after-ms'):
+            return float(headers['retry-after-ms']) / 1000
+        if headers.get('retry-after'):
+            return float(headers['retry-after'])
+    except ValueError:
+        pass
+    return min(60.0, 2 ** attempt) + random.uniform(0, 0.5)
 
 class ImageAnalyzer:
-    def __init__(self):
+    def __init__(self, cache=None, concurrency=ANALYSIS_CONCURRENCY, limiter=None):
+        self.client = None
         if OPENAI_API_KEY:
-            openai.api_key = OPENAI_API_KEY
+            # Retries are handled here so 429s feed the shared rate limiter
+            self.client = openai.OpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL, max_retries=0)
+        self.model = OPENAI_VISION_MODEL
+        self.cache = cache or AnalysisCache()
+        self.concurrency = concurrency
+        self.limiter = limiter or RateLimiter(ANALYSIS_REQUESTS_PER_MINUTE, ANALYSIS_TOKENS_PER_MINUTE)
+        self._stats_lock = threading.Lock()
+        self.prep_stats = {'images': 0, 'original_bytes': 0, 'prepared_bytes': 0}
+        self.response_stats = {'valid': 0, 'malformed': 0}
+    
+    def _prepared_path(self, image_path):
+        extension = '.webp' if POSTER_FORMAT == 'WEBP' else '.jpg'
+        return f"{image_path}{DERIVED_MARKER}{POSTER_MAX_EDGE}-q{POSTER_QUALITY}{extension}"
+    
+    def prepare_image(self, image_path):
+        """Downscale and recompress a poster for upload, caching the result next to the original.
+
+        Returns (bytes, MIME type); the type is read from the bytes, since the
+        original is kept whenever recompressing would not make it smaller.
+        """
+        prepared_path = self._prepared_path(image_path)
+        original_size = os.path.getsize(image_path)
+        
+        if os.path.exists(prepared_path):
+            with open(prepared_path, 'rb') as f:
+                prepared = f.read()
+        else:
+            with Image.open(image_path) as image:
+                image.thumbnail((POSTER_MAX_EDGE, POSTER_MAX_EDGE))
+                if image.mode in ('RGBA', 'LA', 'P'):
+                    image = image.convert('RGBA')
+                    background = Image.new('RGB', image.size, (255, 255, 255))
+                    background.paste(image, mask=image.getchannel('A'))
+                    image = background
+                elif image.mode != 'RGB':
+                    image = image.convert('RGB')
+                
+                # Saving without exif/icc arguments drops the original metadata
+                buffer = io.BytesIO()
+                image.save(buffer, format=POSTER_FORMAT, quality=POSTER_QUALITY, optimize=True)
+                prepared = buffer.getvalue()
+            
+            # Never upload something bigger than the original
+            if len(prepared) >= original_size:
+                with open(image_path, 'rb') as f:
+                    prepared = f.read()
+            
+            # Unique temp name: duplicate events can prepare the same stored image concurrently
+            fd, tmp_path = tempfile.mkstemp(prefix=TEMP_PREFIX, dir=os.path.dirname(prepared_path) or '.')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(prepared)
+            os.replace(tmp_path, prepared_path)
+        
+        with Image.open(io.BytesIO(prepared)) as image:
+            mime_type = Image.MIME.get(image.format, 'application/octet-stream')
+        
+        saved = original_size - len(prepared)
+        with self._stats_lock:
+            self.prep_stats['images'] += 1
+            self.prep_stats['original_bytes'] += original_size
+            self.prep_stats['prepared_bytes'] += len(prepared)
+        print(f"Prepared {os.path.basename(image_path)}: {original_size / 1024:.1f} KB -> "
+              f"{len(prepared) / 1024:.1f} KB (saved {saved / 1024:.1f} KB)")
+        return prepared, mime_type
+    
+    def report_preparation(self):
+        """Print the total upload bytes saved by preprocessing"""
+        stats = self.prep_stats
+        if stats['images']:
+            saved = stats['original_bytes'] - stats['prepared_bytes']
+            print(f"Poster preprocessing: {stats['images']} images, "
+                  f"{stats['original_bytes'] / 1024:.1f} KB -> {stats['prepared_bytes'] / 1024:.1f} KB "
+                  f"(saved {saved / 1024:.1f} KB, {saved / max(stats['original_bytes'], 1):.0%})")
+    
+    def _create_completion(self, messages):
+        """Call the chat completions API within the rate limits, backing off on 429s"""
+        for attempt in range(ANALYSIS_MAX_RETRIES + 1):
+            self.limiter.acquire(ANALYSIS_ESTIMATED_TOKENS)
+            try:
+                response = self.client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    max_tokens=500,
+                    response_format=RESPONSE_FORMAT
+                )
+            except (openai.RateLimitError, openai.InternalServerError, openai.APIConnectionError) as e:
+                if attempt >= ANALYSIS_MAX_RETRIES:
+                    raise
+                delay = _retry_after_seconds(e, attempt)
+                if isinstance(e, openai.RateLimitError):
+                    # Hold back every worker, not just this one
+                    self.limiter.pause(delay)
+                time.sleep(delay)
+                continue
+            
+            usage = getattr(response, 'usage', None)
+            self.limiter.record_usage(ANALYSIS_ESTIMATED_TOKENS, getattr(usage, 'total_tokens', 0))
+            return response
         
-    def analyze_event_poster(self, image_path):
+    def analyze_event_poster(self, image_path, image_hash=None):
         """Analyze event poster using AI to extract relevant information"""
-        if not OPENAI_API_KEY:
+        try:
+            image_hash = image_hash or hash_image_file(image_path)
+            cached = self.cache.get(image_hash, self.model, ANALYSIS_PROMPT_VERSION)
+        except Exception as e:
+            print(f"Analysis cache unavailable for {image_path}: {e}")
+            image_hash, cached = None, None
+        
+        if cached is not None:
+            try:
+                return {
+                    "data": parse_analysis(cached).to_dict(),
+                    "success": True,
+                    "cached": True
+                }
+            except MalformedAnalysis:
+                pass
+        
+        if self.client is None:
             return {"error": "OpenAI API key not configured"}
             
         try:
-            # Read and encode image
-            with open(image_path, 'rb') as image_file:
-                image_data = image_file.read()
-                base64_image = base64.b64encode(image_data).decode('utf-8')
+            # Downscale, recompress and encode image
+            image_data, mime_type = self.prepare_image(image_path)
+            base64_image = base64.b64encode(image_data).decode('utf-8')
             
             # Analyze with OpenAI Vision
-            response = openai.chat.completions.create(
-                model="gpt-4-vision-preview",
-                messages=[
+            response = self._create_completion(
+                [
                     {
                         "role": "user",
                         "content": [
                             {
                                 "type": "text",
-                                "text": """Analyze this event poster and extract the following information in JSON format:
-                                {
-                                    "event_name": "extracted event name",
-                                    "date": "extracted date",
-                                    "time": "extracted time",
-                                    "location": "extracted venue/location",
-                                    "description": "brief description of the event",
-                                    "event_type": "category like concert, meetup, festival, etc.",
-                                    "key_details": ["list", "of", "important", "details"]
-                                }
-                                If any information is not clearly visible, use null for that field."""
+                                "text": ANALYSIS_PROMPT
                             },
                             {
                                 "type": "image_url",
                                 "image_url": {
-                                    "url": f"data:image/jpeg;base64,{base64_image}"
+                                    "url": f"data:{mime_type};base64,{base64_image}"
                                 }
                             }
                         ]
                     }
-                ],
-                max_tokens=500
+                ]
             )
             
+            content = response.choices[0].message.content
+            try:
+                analysis = parse_analysis(content)
+            except MalformedAnalysis as e:
+                self._record_response('malformed')
+                # Not cached, so a --full run (or a changed event) asks again
+                return {
+                    "error": f"Malformed analysis: {e}",
+                    "analysis": content,
+                    "malformed": True,
+                    "success": False
+                }
+            
+            self._record_response('valid')
+            if image_hash:
+                self.cache.put(image_hash, self.model, ANALYSIS_PROMPT_VERSION, analysis.to_json())
+            
             return {
-                "analysis": response.choices[0].message.content,
+                "data": analysis.to_dict(),
                 "success": True
             }
             
@@ -65,15 +232,37 @@ class ImageAnalyzer:
                 "success": False
             }
     
+    def _record_response(self, outcome):
+        with self._stats_lock:
+            self.response_stats[outcome] += 1
+    
+    def analyze_event(self, event):
+        """Analyze one event's poster, if it has one, and attach the result"""
+        if event.get('local_image_path') and os.path.exists(event['local_image_path']):
+            print(f"Analyzing image for: {event['title']}")
+            event['ai_analysis'] = self.analyze_event_poster(event['local_image_path'], event.get('image_hash'))
+        return event
+    
     def batch_analyze_images(self, events):
         """Analyze all event images and add AI insights to event data"""
-        for event in events:
-            if event.get('local_image_path') and os.path.exists(event['local_image_path']):
-                print(f"Analyzing image for: {event['title']}")
-                analysis = self.analyze_event_poster(event['local_image_path'])
-                event['ai_analysis'] = analysis
-                
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            # map() yields in submission order, so results line up with the input
+            events = list(pool.map(self.analyze_event, events))
+        print(f"Analyzed {len(events)} events in {time.perf_counter() - started:.2f}s "
+              f"with {self.concurrency} workers")
+        
+        self.report()
         return events
+    
+    def report(self):
+        """Print preprocessing, response and cache statistics, then trim the cache"""
+        self.report_preparation()
+        stats = self.response_stats
+        if stats['valid'] or stats['malformed']:
+            print(f"Model responses: {stats['valid']} valid, {stats['malformed']} malformed")
+        self.cache.report()
+        self.cache.evict()
 
 if __name__ == "__main__":
     analyzer = ImageAnalyzer()
@@ -0,0 +1,211 @@
+import os
+import time
+import random
+import hashlib
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from config import (
+    IMAGES_DIR, IMAGE_DOWNLOAD_WORKERS, IMAGE_DOWNLOAD_PER_HOST,
+    IMAGE_DOWNLOAD_RETRIES, IMAGE_DOWNLOAD_TIMEOUT
+)
+from event_store import EventStore
+
+# Status codes worth retrying; everything else non-2xx is treated as final
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+CHUNK_SIZE = 64 * 1024
+TEMP_PREFIX = '.download-'
+# Temp files older than this are left over from a crashed run, not an active download
+TEMP_GRACE_SECONDS = 3600
+# Derived files (e.g. downscaled copies for analysis) are named <original><marker><variant>
+DERIVED_MARKER = '.prep-'
+
+CONTENT_TYPE_EXTENSIONS = {
+    'image/jpeg': '.jpg',
+    'image/png': '.png',
+    'image/webp': '.webp',
+    'image/gif': '.gif'
+}
+
+class ImageDownloader:
+    """Download event posters concurrently into a content-addressed image store.
+
+    Files are named by the SHA-256 of their bytes, so identical posters are
+    stored once. The event store's image index remembers each URL's hash and
+    validators, letting repeat scrapes skip unchanged posters with a 304.
+    """
+
+    def __init__(self, store=None, images_dir=IMAGES_DIR, workers=IMAGE_DOWNLOAD_WORKERS,
+                 per_host=IMAGE_DOWNLOAD_PER_HOST, retries=IMAGE_DOWNLOAD_RETRIES,
+                 timeout=IMAGE_DOWNLOAD_TIMEOUT):
+        self.store = store or EventStore()
+        self.images_dir = images_dir
+        os.makedirs(images_dir, exist_ok=True)
+        self.workers = workers
+        self.retries = retries
+        self.timeout = timeout
+        self.session = self._build_session(workers, per_host)
+        self._stats_lock = threading.Lock()
+        self.stats = {'downloaded': 0, 'not_modified': 0, 'deduplicated': 0, 'failed': 0, 'bytes': 0}
+
+    def _build_session(self, workers, per_host):
+        """Create a pooled session; pool_block caps open connections per host"""
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=workers,
+            pool_maxsize=per_host,
+            pool_block=True,
+            max_retries=0  # retries are handled in _fetch so streamed reads are covered too
+        )
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def _record(self, **counts):
+        with self._stats_lock:
+            for name, value in counts.items():
+                self.stats[name] += value
+
+    def _backoff_delay(self, attempt, response=None):
+        """Seconds to wait before the next attempt, honouring Retry-After"""
+        if response is not None:
+            retry_after = response.headers.get('Retry-After', '')
+            if retry_after.isdigit():
+                return float(retry_after)
+        return 0.5 * (2 ** attempt) + random.uniform(0, 0.25)
+
+    def _fetch(self, url, headers):
+        """Stream url into a temp file while hashing it, retrying transient failures.
+
+        Returns (response, temp_path, sha256, bytes_written); temp_path is None for a 304.
+        """
+        for attempt in range(self.retries + 1):
+            tmp_path = None
+            try:
+                response = self.session.get(url, headers=headers, stream=True, timeout=self.timeout)
+                with response:
+                    if response.status_code in RETRY_STATUSES and attempt < self.retries:
+                        time.sleep(self._backoff_delay(attempt, response))
+                        continue
+                    if response.status_code == 304:
+                        return response, None, None, 0
+                    response.raise_for_status()
+
+                    digest = hashlib.sha256()
+                    written = 0
+                    fd, tmp_path = tempfile.mkstemp(prefix=TEMP_PREFIX, dir=self.images_dir)
+                    with os.fdopen(fd, 'wb') as f:
+                        for chunk in response.iter_content(CHUNK_SIZE):
+                            f.write(chunk)
+                            digest.update(chunk)
+                            written += len(chunk)
+                return response, tmp_path, digest.hexdigest(), written
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError):
+                if tmp_path and os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                if attempt >= self.retries:
+                    raise
+                time.sleep(self._backoff_delay(attempt))
+        raise RuntimeError(f"Gave up downloading {url}")
+
+    def _conditional_headers(self, cached):
+        """Validators from a previous fetch, if its file is still on disk"""
+        headers = {}
+        if cached and os.path.exists(cached['path']):
+            if cached['etag']:
+                headers['If-None-Match'] = cached['etag']
+            if cached['last_modified']:
+                headers['If-Modified-Since'] = cached['last_modified']
+        return headers
+
+    def _store_file(self, tmp_path, sha256, content_type):
+        """Move a downloaded temp file to its content-addressed path"""
+        extension = CONTENT_TYPE_EXTENSIONS.get(content_type.split(';')[0].strip().lower(), '.jpg')
+        filepath = os.path.join(self.images_dir, f"{sha256}{extension}")
+        if os.path.exists(filepath):
+            os.remove(tmp_path)
+            return filepath, True
+        os.replace(tmp_path, filepath)
+        return filepath, False
+
+    def download_event(self, event):
+        """Download one event's poster (unless unchanged) and record its local path and hash"""
+        url = event.get('image_url')
+        if not url:
+            return 0
+
+        cached = self.store.get_image(url)
+        try:
+            response, tmp_path, sha256, written = self._fetch(url, self._conditional_headers(cached))
+        except Exception as e:
+            self._record(failed=1)
+            print(f"Error downloading image for {event['title']}: {e}")
+            return 0
+
+        if tmp_path is None:
+            # 304 Not Modified: conditional headers are only sent when we have a cached copy
+            event['local_image_path'] = cached['path']
+            event['image_hash'] = cached['sha256']
+            self._record(not_modified=1)
+            return 0
+
+        filepath, duplicate = self._store_file(tmp_path, sha256, response.headers.get('Content-Type', ''))
+        self.store.record_image(
+            url, sha256, filepath,
+            etag=response.headers.get('ETag', ''),
+            last_modified=response.headers.get('Last-Modified', '')
+        )
+        event['local_image_path'] = filepath
+        event['image_hash'] = sha256
+        self._record(downloaded=1, bytes=written, deduplicated=int(duplicate))
+        print(f"Downloaded image for: {event['title']}")
+        return written
+
+    def download_events(self, events):
+        """Download posters for all events with bounded concurrency"""
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            list(pool.map(self.download_event, events))
+        self.report(time.perf_counter() - started)
+        return events
+
+    def report(self, elapsed):
+        """Print download throughput"""
+        elapsed = max(elapsed, 1e-6)
+        stats = self.stats
+        print(
+            f"Downloaded {stats['downloaded']} images ({stats['bytes'] / 1024:.1f} KB, "
+            f"{stats['not_modified']} unchanged, {stats['deduplicated']} duplicates, "
+            f"{stats['failed']} failed) in {elapsed:.2f}s: "
+            f"{stats['downloaded'] / elapsed:.1f} images/s, {stats['bytes'] / 1024 / elapsed:.1f} KB/s"
+        )
+
+def collect_image_garbage(store=None, images_dir=IMAGES_DIR):
+    """Delete image files that no stored event references; returns (files, bytes) removed"""
+    store = store or EventStore()
+    if not os.path.isdir(images_dir):
+        return 0, 0
+
+    referenced = store.referenced_image_paths()
+    removed_paths = []
+    removed_bytes = 0
+    now = time.time()
+    for name in os.listdir(images_dir):
+        path = os.path.normpath(os.path.join(images_dir, name))
+        if not os.path.isfile(path):
+            continue
+        if name.startswith(TEMP_PREFIX):
+            # May belong to a download or poster preparation still in progress
+            if now - os.path.getmtime(path) < TEMP_GRACE_SECONDS:
+                continue
+        elif path.split(DERIVED_MARKER)[0] in referenced:
+            # Derived files live as long as the original they were made from
+            continue
+        removed_bytes += os.path.getsize(path)
+        os.remove(path)
+        removed_paths.append(path)
+
+    store.forget_images(removed_paths)
+    return len(removed_paths), removed_bytes
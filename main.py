@@ -2,71 +2,133 @@
 """
 Main entry point for the Greensboro Events Scraper
 This script orchestrates the entire process:
-1. Scrape Facebook events
-2. Download and analyze event images with AI
-3. Process and clean the data
-4. Export to spreadsheet
-5. Start the web server for calendar view
+1. Scrape Facebook events, download and analyze their images with AI,
+   and clean the data (stages overlap in a streaming pipeline)
+2. Merge AI-extracted details into the events
+3. Merge near-duplicate events
+4. Save to the event store
+5. Export the stored events (xlsx, Parquet, CSV, NDJSON and/or ICS)
+6. Start the web server for calendar view (Flask's dev server, or gunicorn/waitress with serve-prod)
 """
 
 import sys
 import os
+import shutil
 import argparse
 from datetime import datetime
 
 # Import our modules
-from scraper import FacebookEventScraper
+from scraper import FacebookEventScraper, ReplayScraper
 from image_analyzer import ImageAnalyzer
 from data_processor import EventDataProcessor
-from spreadsheet_exporter import SpreadsheetExporter
-from app import app
-from config import HOST, PORT, DEBUG, SPREADSHEET_PATH
+from event_exporter import EventExporter, EXPORT_FORMATS
+from event_store import EventStore
+from image_downloader import ImageDownloader, collect_image_garbage
+from pipeline import EventPipeline
+from event_dedup import EventDeduplicator
+from scraper_pool import ScraperPool
+from app import app, calendar_app
+from wsgi_server import serve_production
+from config import (
+    HOST, PORT, DEBUG, EVENT_DB_PATH, HEADLESS, SCRAPE_QUERIES, SCRAPE_WORKERS,
+    EXPORT_PATHS, DEFAULT_EXPORT_FORMATS, WSGI_WORKERS, WSGI_THREADS, REPLAY_OUTPUT_DIR
+)
 
-def run_scraper():
+def run_scraper(export_formats=DEFAULT_EXPORT_FORMATS, full=False, queries=None, workers=SCRAPE_WORKERS, headless=HEADLESS,
+                record_dir=None, replay_dir=None, images=True):
     """Run the complete scraping and processing pipeline"""
     print("🚀 Starting Greensboro Events Scraper...")
     print(f"⏰ Started at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     
-    # Step 1: Scrape Facebook events
-    print("\n📱 Step 1: Scraping Facebook events...")
-    scraper = FacebookEventScraper()
-    raw_events = scraper.scrape_events()
-    print(f"✅ Found {len(raw_events)} events")
+    # Step 1: Scrape, download, analyze and clean as a streaming pipeline
+    print("\n📱 Step 1: Scraping events, downloading and analyzing images...")
+    export_paths = EXPORT_PATHS
+    if replay_dir:
+        # A replay never touches the production store or exports, and starts from scratch
+        # every time so replaying the same recording gives the same result
+        output_dir = os.path.join(replay_dir, REPLAY_OUTPUT_DIR)
+        shutil.rmtree(output_dir, ignore_errors=True)
+        os.makedirs(output_dir)
+        store = EventStore(os.path.join(output_dir, os.path.basename(EVENT_DB_PATH)))
+        export_paths = {fmt: os.path.join(output_dir, os.path.basename(path)) for fmt, path in EXPORT_PATHS.items()}
+        full = True
+    else:
+        store = EventStore()
+    processor = EventDataProcessor()
+    if replay_dir:
+        print(f"📼 Replaying recorded pages from {replay_dir} (no browser), writing to {output_dir}")
+        source = ReplayScraper(replay_dir)
+    elif queries:
+        source = ScraperPool(queries, workers=workers, headless=headless, record_dir=record_dir)
+    else:
+        source = FacebookEventScraper(headless=headless, record_dir=record_dir)
+    pipeline = EventPipeline(
+        source,
+        ImageDownloader(store=store) if images else None,
+        ImageAnalyzer() if images else None,
+        processor,
+        # Without --full, events unchanged since the last run skip download/analysis/cleaning
+        known_fingerprints=None if full else store.get_fingerprints()
+    )
+    processed_events = pipeline.run()
+    if isinstance(source, ScraperPool):
+        source.report()
+    pipeline.report()
+    store.touch_events(pipeline.unchanged_keys)
+    print(f"✅ Processed {len(processed_events)} new or changed events "
+          f"({len(pipeline.unchanged_keys)} unchanged)")
     
-    if not raw_events:
-        print("❌ No events found. Exiting...")
-        return
+    if not processed_events:
+        print("✅ Nothing new to process.")
+        return 0
     
-    # Step 2: Download event images
-    print("\n🖼️  Step 2: Downloading event images...")
-    scraper.download_event_images()
+    # Step 2: Report how the AI details merged into the events were read
+    print("\n🧹 Step 2: Merged AI-extracted event details")
+    processor.report()
     
-    # Step 3: Analyze images with AI
-    print("\n🤖 Step 3: Analyzing event images with AI...")
-    analyzer = ImageAnalyzer()
-    events_with_ai = analyzer.batch_analyze_images(raw_events)
+    # Step 3: Merge near-duplicates, within the batch and against stored events
+    print("\n🔗 Step 3: Merging near-duplicate events...")
+    deduplicator = EventDeduplicator(store)
+    duplicates = deduplicator.dedupe_with_store(processed_events)
+    deduplicator.report()
     
-    # Step 4: Process and clean data
-    print("\n🧹 Step 4: Processing and cleaning event data...")
-    processor = EventDataProcessor()
-    processed_events = processor.process_events(events_with_ai)
-    processor.merge_ai_data()
-    
-    # Step 5: Export to spreadsheet
-    print("\n📊 Step 5: Exporting to spreadsheet...")
-    events_df = processor.get_dataframe()
-    
-    if not events_df.empty:
-        exporter = SpreadsheetExporter()
-        exporter.export_events(events_df)
-        exporter.create_summary_sheet(events_df)
-        print(f"✅ Exported {len(events_df)} events to {SPREADSHEET_PATH}")
-    else:
-        print("❌ No valid events to export")
+    # Step 4: Save to the event store
+    print("\n🗄️  Step 4: Saving events to the event store...")
+    saved_count = store.upsert_events(processed_events)
+    if duplicates:
+        # After the upsert, so archived and new canonical events both get their merged fields
+        deduplicator.save(duplicates)
+    print(f"✅ Saved {saved_count} events to {store.db_path} ({store.count_events()} stored in total)")
+    
+    # Step 5: Export the stored events
+    if export_formats:
+        print(f"\n📊 Step 5: Exporting events ({', '.join(export_formats)})...")
+        export_events(store, export_formats, export_paths)
     
     print(f"\n🎉 Scraping completed at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     return len(processed_events)
 
+def export_events(store=None, formats=DEFAULT_EXPORT_FORMATS, paths=None):
+    """Export every stored event in each requested format, from a single read of the store"""
+    store = store or EventStore()
+    events = store.fetch_events()
+    
+    if events:
+        written = EventExporter(paths).export(events, formats)
+        for fmt, path in written.items():
+            print(f"✅ Exported {len(events)} events to {path}")
+    else:
+        print("❌ No valid events to export")
+
+def dedupe_store():
+    """Re-run near-duplicate detection over every stored event"""
+    store = EventStore()
+    deduplicator = EventDeduplicator(store)
+    duplicates = deduplicator.dedupe(store.fetch_events(include_duplicates=True))
+    deduplicator.save(duplicates, reset=True)
+    deduplicator.report()
+    print(f"✅ {store.count_events()} distinct events after merging {len(duplicates)} duplicates")
+
 def start_web_server():
     """Start the Flask web server for calendar view"""
     print(f"\n🌐 Starting web server at http://{HOST}:{PORT}")
@@ -78,6 +140,13 @@ def start_web_server():
     except KeyboardInterrupt:
         print("\n👋 Server stopped by user")
 
+def start_production_server(workers=WSGI_WORKERS, threads=WSGI_THREADS):
+    """Serve the calendar with a multi-worker WSGI server sharing the preloaded event data"""
+    print(f"\n🌐 Starting production server at http://{HOST}:{PORT} "
+          f"({workers} workers x {threads} threads, {len(calendar_app.events_data)} events preloaded)")
+    print("Send SIGHUP to reload the workers; new event data is picked up automatically")
+    serve_production(app, calendar_app, workers=workers, threads=threads)
+
 def main():
     """Main function with command line argument parsing"""
     parser = argparse.ArgumentParser(
@@ -86,9 +155,11 @@ def main():
     
     parser.add_argument(
         '--mode', 
-        choices=['scrape', 'server', 'both'], 
+        choices=['scrape', 'server', 'both', 'export', 'gc-images', 'dedup', 'serve-prod'], 
         default='both',
-        help='Mode to run: scrape only, server only, or both (default: both)'
+        help='Mode to run: scrape only, server only, both, export the stored events, '
+             'delete unreferenced images, merge near-duplicate stored events, '
+             'or serve with a multi-worker WSGI server (default: both)'
     )
     
     parser.add_argument(
@@ -97,6 +168,77 @@ def main():
         help='Run browser in non-headless mode (visible browser window)'
     )
     
+    parser.add_argument(
+        '--multi-query',
+        action='store_true',
+        help='Scrape every search in SCRAPE_QUERIES using a pool of browser workers'
+    )
+    
+    parser.add_argument(
+        '--query',
+        action='append',
+        help='Search query to scrape (repeatable; implies --multi-query with these queries)'
+    )
+    
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=SCRAPE_WORKERS,
+        help=f'Browser worker processes for multi-query scraping (default: {SCRAPE_WORKERS})'
+    )
+    
+    parser.add_argument(
+        '--web-workers',
+        type=int,
+        default=WSGI_WORKERS,
+        help=f'WSGI worker processes for --mode serve-prod (default: {WSGI_WORKERS})'
+    )
+    
+    parser.add_argument(
+        '--threads',
+        type=int,
+        default=WSGI_THREADS,
+        help=f'Threads per WSGI worker for --mode serve-prod (default: {WSGI_THREADS})'
+    )
+    
+    parser.add_argument(
+        '--record',
+        metavar='DIR',
+        help='Save the page HTML after every scroll under DIR for later --replay'
+    )
+    
+    parser.add_argument(
+        '--replay',
+        metavar='DIR',
+        help='Extract events from pages saved with --record instead of starting a browser; implies --full '
+             f'and writes the store and exports to DIR/{REPLAY_OUTPUT_DIR} instead of the production paths'
+    )
+    
+    parser.add_argument(
+        '--no-images',
+        action='store_true',
+        help='Skip downloading and AI-analyzing event images'
+    )
+    
+    parser.add_argument(
+        '--full',
+        action='store_true',
+        help='Reprocess every scraped event, not only new or changed ones'
+    )
+    
+    parser.add_argument(
+        '--export',
+        action='append',
+        choices=EXPORT_FORMATS,
+        help=f"Export format (repeatable; default: {', '.join(DEFAULT_EXPORT_FORMATS)})"
+    )
+    
+    parser.add_argument(
+        '--no-xlsx',
+        action='store_true',
+        help='Skip exporting the stored events to the Excel spreadsheet'
+    )
+    
     args = parser.parse_args()
     
     # Update config if needed
@@ -104,27 +246,58 @@ def main():
         import config
         config.HEADLESS = False
     
+    export_formats = args.export or list(DEFAULT_EXPORT_FORMATS)
+    if args.no_xlsx:
+        export_formats = [fmt for fmt in export_formats if fmt != 'xlsx']
+    
     print("🎯 Greensboro Events Scraper")
     print("=" * 50)
     
+    if args.mode == 'export':
+        export_events(formats=export_formats)
+        return
+    
+    if args.mode == 'gc-images':
+        removed_files, removed_bytes = collect_image_garbage()
+        print(f"🧹 Removed {removed_files} unreferenced images ({removed_bytes / 1024:.1f} KB)")
+        return
+    
+    if args.mode == 'dedup':
+        dedupe_store()
+        return
+    
     if args.mode in ['scrape', 'both']:
-        event_count = run_scraper()
+        queries = args.query or (SCRAPE_QUERIES if args.multi_query else None)
+        event_count = run_scraper(
+            export_formats=export_formats,
+            full=args.full,
+            queries=queries,
+            workers=args.workers,
+            headless=False if args.no_headless else HEADLESS,
+            record_dir=args.record,
+            replay_dir=args.replay,
+            images=not args.no_images
+        )
         
         if args.mode == 'scrape':
             print(f"\n✨ Scraping complete! Found {event_count} events.")
-            print(f"📄 Check {SPREADSHEET_PATH} for the results")
+            results = os.path.join(args.replay, REPLAY_OUTPUT_DIR) if args.replay else EVENT_DB_PATH
+            print(f"📄 Check {results} for the results")
             return
     
-    if args.mode in ['server', 'both']:
+    if args.mode in ['server', 'both', 'serve-prod']:
         if args.mode == 'both':
             print("\n" + "=" * 50)
         
-        # Check if spreadsheet exists
-        if not os.path.exists(SPREADSHEET_PATH):
-            print(f"⚠️  Warning: {SPREADSHEET_PATH} not found.")
+        # Check if there is any event data to serve
+        if not any(os.path.exists(path) for path in [EVENT_DB_PATH] + list(EXPORT_PATHS.values())):
+            print(f"⚠️  Warning: neither {EVENT_DB_PATH} nor any exported events file found.")
             print("Run with --mode scrape first, or the calendar will be empty.")
         
-        start_web_server()
+        if args.mode == 'serve-prod':
+            start_production_server(args.web_workers, args.threads)
+        else:
+            start_web_server()
 
 if __name__ == "__main__":
     try:
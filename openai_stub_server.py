@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the OpenAI chat completions endpoint.
+
+Used to exercise ImageAnalyzer's concurrency, rate limiting and 429 handling
+without network calls or API cost. Point the analyzer at it with:
+
+    OPENAI_API_KEY=stub OPENAI_BASE_URL=http://127.0.0.1:8765/v1 python main.py --mode scrape
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CANNED_ANALYSIS = {
+    "event_name": "Stub Event",
+    "date": "2024-01-01",
+    "time": "19:00",
+    "location": "Greensboro, NC",
+    "description": "Canned response from openai_stub_server.py",
+    "event_type": "meetup",
+    "key_details": ["stub"]
+}
+
+class StubState:
+    def __init__(self, latency, jitter, error_rate, retry_after, malformed_rate=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.malformed_rate = malformed_rate
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.throttled = 0
+        self.malformed = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+class StubHandler(BaseHTTPRequestHandler):
+    state = None
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length) or b'{}')
+
+        state = self.state
+        with state.lock:
+            state.requests += 1
+            state.in_flight += 1
+            state.max_in_flight = max(state.max_in_flight, state.in_flight)
+        try:
+            time.sleep(max(0.0, state.latency + random.uniform(-state.jitter, state.jitter)))
+
+            if random.random() < state.error_rate:
+                with state.lock:
+                    state.throttled += 1
+                self._send_json(
+                    429,
+                    {"error": {"message": "Rate limit reached (stub)", "type": "requests", "code": "rate_limit_exceeded"}},
+                    headers={'Retry-After': str(state.retry_after)}
+                )
+                return
+
+            content = json.dumps(CANNED_ANALYSIS)
+            if random.random() < state.malformed_rate:
+                with state.lock:
+                    state.malformed += 1
+                # Cut off mid-object, like a reply that hit max_tokens
+                content = content[:len(content) // 2]
+            
+            self._send_json(200, {
+                "id": f"chatcmpl-stub-{state.requests}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get('model', 'stub'),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop"
+                }],
+                "usage": {"prompt_tokens": 800, "completion_tokens": 120, "total_tokens": 920}
+            })
+        finally:
+            with state.lock:
+                state.in_flight -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub OpenAI chat completions server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=1.0, help='Seconds per response')
+    parser.add_argument('--jitter', type=float, default=0.2, help='Random +/- seconds added to latency')
+    parser.add_argument('--error-rate', type=float, default=0.1, help='Fraction of requests answered with 429')
+    parser.add_argument('--retry-after', type=int, default=1, help='Retry-After seconds sent with 429s')
+    parser.add_argument('--malformed-rate', type=float, default=0.0, help='Fraction of replies with truncated JSON')
+    args = parser.parse_args()
+
+    StubHandler.state = StubState(args.latency, args.jitter, args.error_rate, args.retry_after,
+                                  args.malformed_rate)
+    server = ThreadingHTTPServer((args.host, args.port), StubHandler)
+    print(f"Stub OpenAI server on http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        state = StubHandler.state
+        print(f"\n{state.requests} requests, {state.throttled} throttled, {state.malformed} malformed, "
+              f"max {state.max_in_flight} in flight")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Serialized, pre-compressed API responses.
+
+A snapshot of the event data never changes once built, so each distinct
+response body is serialized and compressed once, then served as-is with a
+strong ETag until the next data version replaces the whole cache.
+"""
+
+import gzip
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from config import PAYLOAD_CACHE_SIZE, PAYLOAD_COMPRESS_MIN_BYTES, PAYLOAD_GZIP_LEVEL, PAYLOAD_BROTLI_QUALITY
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+def available_encodings():
+    """Content-Encodings this process can precompute, preferred first"""
+    return (['br'] if brotli is not None else []) + ['gzip']
+
+def data_version(signature):
+    """Short, stable token for a data source signature (see EventCalendarApp._get_source_signature)"""
+    return hashlib.blake2b(repr(signature).encode('utf-8'), digest_size=8).hexdigest()
+
+class EncodedPayload:
+    """One JSON body with its compressed variants and a strong ETag per encoding"""
+
+    def __init__(self, data):
+        self.body = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        digest = hashlib.blake2b(self.body, digest_size=16).hexdigest()
+        self.bodies = {'identity': self.body}
+        self.etags = {'identity': digest}
+        # Small bodies are not worth the CPU or the extra header bytes
+        if len(self.body) >= PAYLOAD_COMPRESS_MIN_BYTES:
+            # mtime=0 keeps the gzip bytes, and so the ETag, identical across workers and restarts
+            self.bodies['gzip'] = gzip.compress(self.body, compresslevel=PAYLOAD_GZIP_LEVEL, mtime=0)
+            self.etags['gzip'] = f"{digest}-gzip"
+            if brotli is not None:
+                self.bodies['br'] = brotli.compress(self.body, quality=PAYLOAD_BROTLI_QUALITY)
+                self.etags['br'] = f"{digest}-br"
+
+    def select(self, accept_encodings):
+        """Pick the best encoding the client accepts; returns (encoding, body, etag)"""
+        for encoding in available_encodings():
+            if encoding in self.bodies and accept_encodings[encoding]:
+                return encoding, self.bodies[encoding], self.etags[encoding]
+        return 'identity', self.body, self.etags['identity']
+
+    def matches(self, if_none_match):
+        """Whether the client already holds this body in any encoding"""
+        return any(if_none_match.contains(etag) for etag in self.etags.values())
+
+class PayloadCache:
+    """Thread-safe LRU of EncodedPayloads for one data version, keyed by query"""
+
+    def __init__(self, maxsize=PAYLOAD_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._payloads = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, build):
+        """Return the payload for `key`, serializing build() on a miss"""
+        with self._lock:
+            payload = self._payloads.get(key)
+            if payload is not None:
+                self._payloads.move_to_end(key)
+                return payload
+        # Encode outside the lock; two racing misses just do the work twice
+        payload = EncodedPayload(build())
+        with self._lock:
+            self._payloads[key] = payload
+            self._payloads.move_to_end(key)
+            while len(self._payloads) > self.maxsize:
+                self._payloads.popitem(last=False)
+        return payload
+
+    def __len__(self):
+        return len(self._payloads)
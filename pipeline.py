@@ -0,0 +1,205 @@
+import threading
+import time
+from queue import Queue
+from config import PIPELINE_QUEUE_SIZE, IMAGE_DOWNLOAD_WORKERS, ANALYSIS_CONCURRENCY
+from event_store import make_event_key, event_fingerprint
+
+# Marks the end of a stage's input; one is sent per worker
+_DONE = object()
+
+class StageStats:
+    """Timing and queue-depth counters for one pipeline stage"""
+
+    def __init__(self, name, workers):
+        self.name = name
+        self.workers = workers
+        self.items = 0
+        self.busy_seconds = 0.0
+        self.first_start = None
+        self.last_finish = None
+        self.max_queue_depth = 0
+        self._depth_total = 0
+        self._depth_samples = 0
+        self._lock = threading.Lock()
+
+    def record_item(self, started, finished):
+        with self._lock:
+            self.items += 1
+            self.busy_seconds += finished - started
+            if self.first_start is None or started < self.first_start:
+                self.first_start = started
+            if self.last_finish is None or finished > self.last_finish:
+                self.last_finish = finished
+
+    def record_depth(self, depth):
+        with self._lock:
+            self.max_queue_depth = max(self.max_queue_depth, depth)
+            self._depth_total += depth
+            self._depth_samples += 1
+
+    @property
+    def mean_queue_depth(self):
+        return self._depth_total / self._depth_samples if self._depth_samples else 0.0
+
+    @property
+    def wall_seconds(self):
+        if self.first_start is None:
+            return 0.0
+        return self.last_finish - self.first_start
+
+class EventPipeline:
+    """Stream events through extraction -> image download -> AI analysis, then clean them.
+
+    Stages run concurrently and hand events over through bounded queues, so
+    analysis of the first posters starts while the scraper is still scrolling.
+    Analyzed events are collected by the processor and cleaned in one
+    columnar pass once every stage has drained.
+
+    `downloader` and `analyzer` may be None to pass events straight through
+    those stages (e.g. when replaying recorded pages offline).
+
+    Events whose fingerprint matches `known_fingerprints` (from the event
+    store) are unchanged since the last run and skip every stage after
+    extraction; their keys are collected in `unchanged_keys`. The fingerprint
+    is dropped when a configured stage failed (download error, API error), so
+    such an event is retried on the next run.
+    """
+
+    def __init__(self, scraper, downloader, analyzer, processor, queue_size=PIPELINE_QUEUE_SIZE,
+                 download_workers=IMAGE_DOWNLOAD_WORKERS, analysis_workers=ANALYSIS_CONCURRENCY,
+                 known_fingerprints=None):
+        self.scraper = scraper
+        self.downloader = downloader
+        self.analyzer = analyzer
+        self.processor = processor
+        self.queue_size = queue_size
+        self.stages = {
+            'extract': StageStats('extract', 1),
+            'download': StageStats('download', download_workers),
+            'analyze': StageStats('analyze', analysis_workers),
+            'collect': StageStats('collect', 1)
+        }
+        self.clean_seconds = 0.0
+        self.known_fingerprints = known_fingerprints or {}
+        self.unchanged_keys = []
+        self.elapsed = 0.0
+
+    def _completed(self, event):
+        """Whether every stage that ran for an event succeeded: poster stored, model answered"""
+        if not event.get('image_url'):
+            return True
+        if self.downloader is not None and not event.get('local_image_path'):
+            return False
+        # Without a poster, an analyzer or an API key there was no analysis to fail
+        if not event.get('local_image_path') or self.analyzer is None or self.analyzer.client is None:
+            return True
+        analysis = event.get('ai_analysis') or {}
+        # A malformed reply is kept as final: re-sending the same poster every run costs
+        # money and rarely helps; --full, or a change to the event, asks again
+        return bool(analysis.get('success') or analysis.get('malformed'))
+
+    def _collect(self, event):
+        if not self._completed(event):
+            # No fingerprint is stored, so the next run does not skip this event
+            event['fingerprint'] = ''
+        self.processor.add_event(event)
+    
+    def _put(self, queue, item, stats):
+        queue.put(item)
+        stats.record_depth(queue.qsize())
+
+    def _worker(self, stage, inbox, outbox, handle):
+        """Apply `handle` to every event from inbox and pass it on to outbox"""
+        stats = self.stages[stage]
+        next_stats = self._next_stage(stage)
+        while True:
+            event = inbox.get()
+            if event is _DONE:
+                return
+            started = time.perf_counter()
+            try:
+                handle(event)
+            except Exception as e:
+                # A failed step should not drop the event from the rest of the pipeline
+                print(f"Error in {stage} stage for {event.get('title', '')}: {e}")
+                event['fingerprint'] = ''
+            stats.record_item(started, time.perf_counter())
+            if outbox is not None:
+                self._put(outbox, event, next_stats)
+
+    def _next_stage(self, stage):
+        names = list(self.stages)
+        index = names.index(stage) + 1
+        return self.stages[names[index]] if index < len(names) else None
+
+    def _start_workers(self, stage, inbox, outbox, handle):
+        threads = [
+            threading.Thread(target=self._worker, args=(stage, inbox, outbox, handle),
+                             name=f"pipeline-{stage}-{i}", daemon=True)
+            for i in range(self.stages[stage].workers)
+        ]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    def _finish_stage(self, inbox, threads):
+        """Signal end of input to every worker of a stage and wait for them"""
+        for _ in threads:
+            inbox.put(_DONE)
+        for thread in threads:
+            thread.join()
+
+    def run(self):
+        """Run the pipeline to completion and return the cleaned events"""
+        started = time.perf_counter()
+        download_queue = Queue(maxsize=self.queue_size)
+        analyze_queue = Queue(maxsize=self.queue_size)
+        collect_queue = Queue(maxsize=self.queue_size)
+
+        skip = lambda event: None
+        download_threads = self._start_workers('download', download_queue, analyze_queue,
+                                               self.downloader.download_event if self.downloader else skip)
+        analyze_threads = self._start_workers('analyze', analyze_queue, collect_queue,
+                                              self.analyzer.analyze_event if self.analyzer else skip)
+        collect_threads = self._start_workers('collect', collect_queue, None, self._collect)
+
+        # Extraction runs on this thread; put() blocks when downstream falls behind
+        extract_stats = self.stages['extract']
+        item_started = time.perf_counter()
+        for event in self.scraper.iter_events():
+            extract_stats.record_item(item_started, time.perf_counter())
+            key = make_event_key(event)
+            event['fingerprint'] = event_fingerprint(event)
+            if self.known_fingerprints.get(key) == event['fingerprint']:
+                self.unchanged_keys.append(key)
+            else:
+                self._put(download_queue, event, self.stages['download'])
+            item_started = time.perf_counter()
+
+        # Drain stages in order: each is finished only once its producers are
+        self._finish_stage(download_queue, download_threads)
+        self._finish_stage(analyze_queue, analyze_threads)
+        self._finish_stage(collect_queue, collect_threads)
+
+        clean_started = time.perf_counter()
+        processed_events = self.processor.process_events()
+        self.clean_seconds = time.perf_counter() - clean_started
+
+        self.elapsed = time.perf_counter() - started
+        return processed_events
+
+    def report(self):
+        """Print per-stage timings and queue depths"""
+        print(f"Pipeline finished in {self.elapsed:.2f}s "
+              f"({len(self.unchanged_keys)} unchanged events skipped)")
+        print(f"{'stage':<10}{'workers':>8}{'items':>7}{'busy s':>9}{'wall s':>9}{'max q':>7}{'mean q':>8}")
+        for stats in self.stages.values():
+            print(
+                f"{stats.name:<10}{stats.workers:>8}{stats.items:>7}{stats.busy_seconds:>9.2f}"
+                f"{stats.wall_seconds:>9.2f}{stats.max_queue_depth:>7}{stats.mean_queue_depth:>8.1f}"
+            )
+        print(f"Cleaned {len(self.processor.processed_events)} events in {self.clean_seconds:.2f}s")
+        if self.downloader:
+            self.downloader.report(self.stages['download'].wall_seconds)
+        if self.analyzer:
+            self.analyzer.report()
@@ -0,0 +1,66 @@
+import threading
+import time
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at a per-minute rate"""
+
+    def __init__(self, per_minute, capacity=None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount=1):
+        """Block until `amount` tokens are available, then take them"""
+        # A single request larger than the bucket would otherwise wait forever
+        amount = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def adjust(self, amount):
+        """Charge (positive) or refund (negative) tokens after the real cost is known"""
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens - amount)
+
+class RateLimiter:
+    """Requests/min and tokens/min limits plus a shared pause for 429 responses"""
+
+    def __init__(self, requests_per_minute, tokens_per_minute):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def pause(self, seconds):
+        """Stop every caller from sending for `seconds` (e.g. from Retry-After)"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def acquire(self, estimated_tokens):
+        """Wait until a request of roughly `estimated_tokens` may be sent"""
+        while True:
+            with self._lock:
+                wait = self._paused_until - time.monotonic()
+            if wait <= 0:
+                break
+            time.sleep(wait)
+        self.requests.acquire(1)
+        self.tokens.acquire(estimated_tokens)
+
+    def record_usage(self, estimated_tokens, actual_tokens):
+        """Correct the token bucket once the response reports real usage"""
+        if actual_tokens:
+            self.tokens.adjust(actual_tokens - estimated_tokens)
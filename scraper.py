@@ -1,146 +1,367 @@
 import time
-import requests
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.common.exceptions import TimeoutException, SessionNotCreatedException
 from webdriver_manager.chrome import ChromeDriverManager
-from bs4 import BeautifulSoup
 import pandas as pd
 from datetime import datetime
 import os
-from config import LOCATION, SEARCH_RADIUS, HEADLESS, BROWSER_TIMEOUT, IMAGES_DIR
+import re
+import json
+import glob
+import tempfile
+from urllib.parse import quote
+from config import (
+    LOCATION, SEARCH_RADIUS, HEADLESS, BROWSER_TIMEOUT,
+    CHROMEDRIVER_PATH, DRIVER_CACHE_FILE, BROWSER_LIGHTWEIGHT,
+    SCRAPE_TARGET_EVENTS, SCRAPE_MAX_SCROLLS, PAGE_READY_TIMEOUT,
+    SCROLL_WAIT_TIMEOUT, SCROLL_POLL_INTERVAL
+)
+from image_downloader import ImageDownloader
+from event_store import make_event_key
+from html_parsing import get_backend
+
+# Page height and number of event cards, read in one round trip
+PAGE_PROGRESS_JS = (
+    "return [document.body.scrollHeight, "
+    "document.querySelectorAll('div[role=\"article\"]').length];"
+)
+
+# Pull only event cards not returned before, already reduced to the fields we parse.
+# Cards are tagged with data-gso-seen so each is serialized once per page.
+EXTRACT_NEW_EVENTS_JS = """
+let cards = document.querySelectorAll('div[role="article"]');
+if (!cards.length) {
+    cards = Array.from(document.querySelectorAll('div[class]'))
+        .filter(div => div.className.toLowerCase().includes('event'));
+}
+const records = [];
+for (const card of cards) {
+    if (card.hasAttribute('data-gso-seen')) continue;
+    card.setAttribute('data-gso-seen', '1');
+    const titleElem = card.querySelector('a[role="link"]') || card.querySelector('h3');
+    const imgElem = card.querySelector('img');
+    const linkElem = card.querySelector('a[href]');
+    records.push({
+        // Same normalization as html_parsing.collapse_whitespace
+        title: titleElem ? titleElem.textContent.replace(/\s+/g, ' ').trim() : '',
+        image_url: imgElem ? (imgElem.getAttribute('src') || '') : '',
+        href: linkElem ? linkElem.getAttribute('href') : ''
+    });
+}
+return records;
+"""
+
+# Content settings that skip work the scraper never uses; posters are
+# downloaded separately by ImageDownloader from the <img src> URLs
+LIGHTWEIGHT_PREFS = {
+    'profile.managed_default_content_settings.images': 2,
+    'profile.default_content_setting_values.notifications': 2,
+    'profile.default_content_setting_values.geolocation': 2,
+    'profile.default_content_setting_values.media_stream': 2,
+    'profile.managed_default_content_settings.plugins': 2,
+}
+LIGHTWEIGHT_ARGS = [
+    '--blink-settings=imagesEnabled=false',
+    '--disable-extensions',
+    '--disable-gpu',
+    '--mute-audio',
+    '--no-first-run',
+    '--no-default-browser-check',
+    '--disable-background-networking',
+    '--disable-component-update',
+    '--disable-sync',
+]
+
+def resolve_chromedriver_path(refresh=False):
+    """Return a chromedriver path, asking webdriver-manager only when nothing is cached (or on refresh)"""
+    if CHROMEDRIVER_PATH and os.path.exists(CHROMEDRIVER_PATH):
+        return CHROMEDRIVER_PATH
+    
+    if not refresh:
+        try:
+            with open(DRIVER_CACHE_FILE) as f:
+                cached_path = json.load(f).get('path')
+            if cached_path and os.path.exists(cached_path):
+                return cached_path
+        except (OSError, ValueError):
+            pass
+    
+    # Network lookup; pin the result so later runs skip it
+    path = ChromeDriverManager().install()
+    # Several ScraperPool processes may resolve at once: never leave a half-written file
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(DRIVER_CACHE_FILE)), suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump({'path': path, 'resolved_at': datetime.now().isoformat()}, f)
+    os.replace(tmp_path, DRIVER_CACHE_FILE)
+    return path
+
+def query_slug(query):
+    """Directory-safe name for a search query"""
+    return re.sub(r'[^a-z0-9]+', '-', query.lower()).strip('-') or 'query'
 
 class FacebookEventScraper:
-    def __init__(self):
+    def __init__(self, headless=None, record_dir=None):
+        self.headless = HEADLESS if headless is None else headless
+        self.record_dir = record_dir
+        self.timings = {}
+        self._started = time.perf_counter()
         self.setup_driver()
         self.events = []
+        self.parser = get_backend()
         
     def setup_driver(self):
         """Setup Chrome WebDriver with appropriate options"""
         chrome_options = Options()
-        if HEADLESS:
+        if self.headless:
             chrome_options.add_argument("--headless")
         chrome_options.add_argument("--no-sandbox")
         chrome_options.add_argument("--disable-dev-shm-usage")
         chrome_options.add_argument("--disable-blink-features=AutomationControlled")
         chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
         chrome_options.add_experimental_option('useAutomationExtension', False)
+        if BROWSER_LIGHTWEIGHT:
+            for argument in LIGHTWEIGHT_ARGS:
+                chrome_options.add_argument(argument)
+            chrome_options.add_experimental_option('prefs', LIGHTWEIGHT_PREFS)
+            # Return from get() at DOMContentLoaded; readiness is awaited explicitly
+            chrome_options.page_load_strategy = 'eager'
+        
+        started = time.perf_counter()
+        driver_path = resolve_chromedriver_path()
+        self.timings['driver_resolve'] = time.perf_counter() - started
         
-        service = Service(ChromeDriverManager().install())
-        self.driver = webdriver.Chrome(service=service, options=chrome_options)
+        try:
+            self.driver = webdriver.Chrome(service=Service(driver_path), options=chrome_options)
+        except SessionNotCreatedException:
+            if driver_path == CHROMEDRIVER_PATH:
+                raise
+            # The cached driver no longer matches Chrome (e.g. after an auto-update): resolve it again
+            print("Cached chromedriver does not match the installed Chrome, resolving a new one")
+            service = Service(resolve_chromedriver_path(refresh=True))
+            self.driver = webdriver.Chrome(service=service, options=chrome_options)
         self.driver.set_page_load_timeout(BROWSER_TIMEOUT)
+        self.timings['browser_start'] = time.perf_counter() - started - self.timings['driver_resolve']
         
     def scrape_events(self):
         """Scrape Facebook events for Greensboro, NC"""
+        for _ in self.iter_events():
+            pass
+        return self.events
+    
+    def iter_events(self):
+        """Yield each new event for the default location, then close the browser"""
+        try:
+            yield from self.iter_query_events(LOCATION)
+        finally:
+            self.close()
+    
+    def close(self):
+        """Quit the browser"""
+        self.driver.quit()
+    
+    def iter_query_events(self, query):
+        """Yield each new event for one search query as soon as it shows up while scrolling.
+        
+        The browser stays open so the same driver can serve further queries.
+        """
+        seen_keys = set()
+        found = []
         try:
             # Navigate to Facebook events search
-            search_url = f"https://www.facebook.com/events/search/?q={LOCATION.replace(' ', '%20')}"
+            search_url = f"https://www.facebook.com/events/search/?q={quote(query)}"
             self.driver.get(search_url)
-            time.sleep(5)
-            
-            # Scroll to load more events
-            self._scroll_and_load()
+            self._wait_for_first_events()
+            if 'time_to_first_page' not in self.timings:
+                self._report_startup()
+            if self.record_dir:
+                self._start_recording(query)
             
-            # Extract event data
-            self._extract_event_data()
+            # Extract after every scroll so downstream stages can start early
+            for scroll_number, scroll_seconds in self._scroll_and_load(found):
+                if self.record_dir:
+                    self._record_snapshot(query, scroll_number)
+                new_events = 0
+                for event in self._extract_new_events():
+                    key = make_event_key(event)
+                    if key in seen_keys:
+                        continue
+                    seen_keys.add(key)
+                    event['query'] = query
+                    found.append(event)
+                    self.events.append(event)
+                    new_events += 1
+                    yield event
+                print(f"[{query}] Scroll {scroll_number}: {scroll_seconds:.2f}s, "
+                      f"{new_events} new events ({len(found)} total)")
             
         except Exception as e:
-            print(f"Error scraping events: {e}")
-        finally:
-            self.driver.quit()
-            
-        return self.events
+            print(f"Error scraping events for '{query}': {e}")
+    
+    def _start_recording(self, query):
+        """Create the snapshot directory for a query and describe it in manifest.json"""
+        query_dir = os.path.join(self.record_dir, query_slug(query))
+        os.makedirs(query_dir, exist_ok=True)
+        for old_snapshot in glob.glob(os.path.join(query_dir, 'scroll_*.html')):
+            os.remove(old_snapshot)
+        with open(os.path.join(query_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+            json.dump({'query': query, 'recorded_at': datetime.now().isoformat()}, f, indent=2)
+    
+    def _record_snapshot(self, query, scroll_number):
+        """Save the page as it looks after a scroll, for offline replay"""
+        path = os.path.join(self.record_dir, query_slug(query), f"scroll_{scroll_number:03d}.html")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.driver.page_source)
+    
+    def _report_startup(self):
+        """Record and print how long it took from construction to the first usable page"""
+        self.timings['time_to_first_page'] = time.perf_counter() - self._started
+        print(f"Startup: driver lookup {self.timings['driver_resolve']:.2f}s, "
+              f"browser launch {self.timings['browser_start']:.2f}s, "
+              f"time to first page {self.timings['time_to_first_page']:.2f}s")
     
-    def _scroll_and_load(self):
-        """Scroll page to load more events"""
-        last_height = self.driver.execute_script("return document.body.scrollHeight")
-        scroll_attempts = 0
-        max_scrolls = 10
+    def _page_progress(self):
+        """Return (page height, event card count)"""
+        height, count = self.driver.execute_script(PAGE_PROGRESS_JS)
+        return height, count
+    
+    def _wait_for_first_events(self):
+        """Wait until the first event cards render instead of sleeping a fixed time"""
+        try:
+            WebDriverWait(self.driver, PAGE_READY_TIMEOUT, poll_frequency=SCROLL_POLL_INTERVAL).until(
+                lambda driver: self._page_progress()[1] > 0
+            )
+        except TimeoutException:
+            print(f"No event cards after {PAGE_READY_TIMEOUT}s, extracting whatever loaded")
+    
+    def _scroll_and_load(self, found, target_events=SCRAPE_TARGET_EVENTS, max_scrolls=SCRAPE_MAX_SCROLLS):
+        """Scroll until enough events are found, yielding (scroll number, seconds) after each batch"""
+        yield 0, 0.0
         
-        while scroll_attempts < max_scrolls:
+        scroll_number = 0
+        while scroll_number < max_scrolls and len(found) < target_events:
+            last_height, last_count = self._page_progress()
+            started = time.perf_counter()
             self.driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-            time.sleep(3)
             
-            new_height = self.driver.execute_script("return document.body.scrollHeight")
-            if new_height == last_height:
+            # Done as soon as new cards appear or the page grows; give up after the timeout
+            try:
+                WebDriverWait(self.driver, SCROLL_WAIT_TIMEOUT, poll_frequency=SCROLL_POLL_INTERVAL).until(
+                    lambda driver: self._page_progress() != (last_height, last_count)
+                )
+            except TimeoutException:
+                print(f"No new content after {SCROLL_WAIT_TIMEOUT}s, stopping at {scroll_number} scrolls")
                 break
-            last_height = new_height
-            scroll_attempts += 1
+            
+            scroll_number += 1
+            yield scroll_number, time.perf_counter() - started
     
-    def _extract_event_data(self):
-        """Extract event information from the page"""
-        soup = BeautifulSoup(self.driver.page_source, 'html.parser')
-        
-        # Find event containers (Facebook's structure changes frequently)
-        event_containers = soup.find_all('div', {'role': 'article'}) or soup.find_all('div', class_=lambda x: x and 'event' in x.lower())
+    def _extract_new_events(self):
+        """Extract only the event cards added since the last call, via a DOM query in the browser"""
+        records = self.driver.execute_script(EXTRACT_NEW_EVENTS_JS) or []
+        events = []
+        for record in records:
+            event = self._build_event(record.get('title', ''), record.get('image_url', ''), record.get('href', ''))
+            if event:
+                events.append(event)
+        return events
+    
+    def _extract_event_data(self, html=None, scraped_at=None):
+        """Extract event information from the full page HTML"""
+        html = html if html is not None else self.driver.page_source
         
-        for container in event_containers:
-            event_data = self._parse_event_container(container)
+        events = []
+        for record in self.parser.extract_cards(html):
+            event_data = self._build_event(record['title'], record['image_url'], record['href'], scraped_at)
             if event_data:
-                self.events.append(event_data)
+                events.append(event_data)
+        return events
     
-    def _parse_event_container(self, container):
-        """Parse individual event container"""
-        try:
-            event = {
-                'title': '',
-                'date': '',
-                'time': '',
-                'location': '',
-                'description': '',
-                'image_url': '',
-                'event_url': '',
-                'scraped_at': datetime.now().isoformat()
-            }
-            
-            # Extract title
-            title_elem = container.find('a', {'role': 'link'}) or container.find('h3')
-            if title_elem:
-                event['title'] = title_elem.get_text(strip=True)
-            
-            # Extract image URL
-            img_elem = container.find('img')
-            if img_elem and img_elem.get('src'):
-                event['image_url'] = img_elem['src']
-            
-            # Extract event URL
-            link_elem = container.find('a', href=True)
-            if link_elem:
-                event['event_url'] = link_elem['href']
-                if not event['event_url'].startswith('http'):
-                    event['event_url'] = 'https://facebook.com' + event['event_url']
-            
-            # Only return events with at least a title
-            if event['title']:
-                return event
-                
-        except Exception as e:
-            print(f"Error parsing event container: {e}")
+    def _build_event(self, title, image_url, href, scraped_at=None):
+        """Build an event record from the fields extracted from one card"""
+        event = {
+            'title': title or '',
+            'date': '',
+            'time': '',
+            'location': '',
+            'description': '',
+            'image_url': image_url or '',
+            'event_url': href or '',
+            'scraped_at': scraped_at or datetime.now().isoformat()
+        }
         
+        if event['event_url'] and not event['event_url'].startswith('http'):
+            event['event_url'] = 'https://facebook.com' + event['event_url']
+        
+        # Only return events with at least a title
+        if event['title']:
+            return event
         return None
     
     def download_event_images(self):
         """Download event poster images"""
-        if not os.path.exists(IMAGES_DIR):
-            os.makedirs(IMAGES_DIR)
-            
-        for i, event in enumerate(self.events):
-            if event.get('image_url'):
-                try:
-                    response = requests.get(event['image_url'], timeout=10)
-                    if response.status_code == 200:
-                        filename = f"event_{i}_{int(time.time())}.jpg"
-                        filepath = os.path.join(IMAGES_DIR, filename)
-                        
-                        with open(filepath, 'wb') as f:
-                            f.write(response.content)
-                        
-                        event['local_image_path'] = filepath
-                        print(f"Downloaded image for: {event['title']}")
-                        
-                except Exception as e:
-                    print(f"Error downloading image for {event['title']}: {e}")
+        ImageDownloader().download_events(self.events)
+
+class ReplayScraper(FacebookEventScraper):
+    """Replay page snapshots saved with --record, without starting a browser.
+    
+    Each query directory holds manifest.json and scroll_NNN.html files; the
+    snapshots go through the same _extract_event_data path as live HTML and
+    keep their recorded scraped_at, so runs are repeatable.
+    """
+    
+    def __init__(self, replay_dir):
+        self.replay_dir = replay_dir
+        self.events = []
+        self.timings = {}
+        self.parser = get_backend()
+    
+    def close(self):
+        pass
+    
+    def recorded_queries(self):
+        """(query, directory, manifest) for every recorded query, in name order"""
+        recorded = []
+        for manifest_path in sorted(glob.glob(os.path.join(self.replay_dir, '*', 'manifest.json'))):
+            with open(manifest_path, encoding='utf-8') as f:
+                manifest = json.load(f)
+            recorded.append((manifest['query'], os.path.dirname(manifest_path), manifest))
+        return recorded
+    
+    def iter_events(self):
+        """Yield the events of every recorded query"""
+        seen_keys = set()
+        for query, _, _ in self.recorded_queries():
+            for event in self.iter_query_events(query):
+                key = make_event_key(event)
+                if key not in seen_keys:
+                    seen_keys.add(key)
+                    yield event
+    
+    def iter_query_events(self, query):
+        """Yield each new event from one query's snapshots, in scroll order"""
+        query_dir = os.path.join(self.replay_dir, query_slug(query))
+        with open(os.path.join(query_dir, 'manifest.json'), encoding='utf-8') as f:
+            recorded_at = json.load(f).get('recorded_at')
+        
+        seen_keys = set()
+        for snapshot in sorted(glob.glob(os.path.join(query_dir, 'scroll_*.html'))):
+            with open(snapshot, encoding='utf-8') as f:
+                html = f.read()
+            new_events = 0
+            for event in self._extract_event_data(html, scraped_at=recorded_at):
+                key = make_event_key(event)
+                if key in seen_keys:
+                    continue
+                seen_keys.add(key)
+                event['query'] = query
+                self.events.append(event)
+                new_events += 1
+                yield event
+            print(f"[{query}] Replayed {os.path.basename(snapshot)}: {new_events} new events")
 
 if __name__ == "__main__":
     scraper = FacebookEventScraper()
@@ -0,0 +1,131 @@
+import multiprocessing
+import queue
+import time
+from config import SCRAPE_WORKERS, HEADLESS
+from event_store import make_event_key
+
+def _scrape_worker(worker_id, tasks, results, headless, record_dir):
+    """Worker process: one browser, reused for every query it picks up"""
+    # Imported here so the parent never needs Selenium to hand out work
+    from scraper import FacebookEventScraper
+
+    started = time.perf_counter()
+    try:
+        scraper = FacebookEventScraper(headless=headless, record_dir=record_dir)
+        startup_error = None
+    except Exception as e:
+        scraper = None
+        startup_error = f"browser failed to start: {e}"
+    startup_seconds = time.perf_counter() - started
+
+    try:
+        while True:
+            query = tasks.get()
+            if query is None:
+                break
+            query_started = time.perf_counter()
+            events, error = [], startup_error
+            if scraper is not None:
+                try:
+                    events = list(scraper.iter_query_events(query))
+                except Exception as e:
+                    error = str(e)
+            results.put({
+                'query': query,
+                'worker': worker_id,
+                'events': events,
+                'seconds': time.perf_counter() - query_started,
+                'startup_seconds': startup_seconds,
+                'time_to_first_page': scraper.timings.get('time_to_first_page') if scraper else None,
+                'error': error
+            })
+    finally:
+        if scraper is not None:
+            scraper.close()
+
+class ScraperPool:
+    """Spread search queries over N headless browser processes and merge the results.
+
+    Exposes iter_events() like FacebookEventScraper, so it can feed the
+    streaming pipeline directly; events are deduplicated by event key as
+    each query's results arrive.
+    """
+
+    def __init__(self, queries, workers=SCRAPE_WORKERS, headless=HEADLESS, record_dir=None):
+        self.queries = list(queries)
+        self.workers = max(1, min(workers, len(self.queries)))
+        self.headless = headless
+        self.record_dir = record_dir
+        self.events = []
+        self.query_reports = []
+        self.elapsed = 0.0
+
+    def iter_events(self):
+        """Yield unique events as each query finishes"""
+        started = time.perf_counter()
+        # spawn: a forked Chrome/Selenium state is not safe to share
+        ctx = multiprocessing.get_context('spawn')
+        tasks = ctx.Queue()
+        results = ctx.Queue()
+        for query in self.queries:
+            tasks.put(query)
+        for _ in range(self.workers):
+            tasks.put(None)
+
+        processes = [
+            ctx.Process(target=_scrape_worker, args=(i, tasks, results, self.headless, self.record_dir), daemon=True)
+            for i in range(self.workers)
+        ]
+        for process in processes:
+            process.start()
+
+        seen_keys = set()
+        try:
+            pending = len(self.queries)
+            while pending:
+                try:
+                    report = results.get(timeout=5)
+                except queue.Empty:
+                    if not any(process.is_alive() for process in processes):
+                        print(f"Scraper workers exited with {pending} queries unfinished")
+                        break
+                    continue
+                pending -= 1
+
+                new_events = 0
+                for event in report.pop('events'):
+                    key = make_event_key(event)
+                    if key in seen_keys:
+                        continue
+                    seen_keys.add(key)
+                    self.events.append(event)
+                    new_events += 1
+                    yield event
+                report['new_events'] = new_events
+                self.query_reports.append(report)
+        finally:
+            for process in processes:
+                process.join(timeout=30)
+                if process.is_alive():
+                    process.terminate()
+            self.elapsed = time.perf_counter() - started
+
+    def scrape_events(self):
+        """Run every query and return the merged, deduplicated events"""
+        for _ in self.iter_events():
+            pass
+        return self.events
+
+    def report(self):
+        """Print worker count, startup and per-query timings"""
+        print(f"Scraped {len(self.queries)} queries with {self.workers} browser workers "
+              f"in {self.elapsed:.2f}s ({len(self.events)} unique events)")
+        startups = {}
+        for report in self.query_reports:
+            if report['time_to_first_page'] is not None:
+                startups.setdefault(report['worker'], report['time_to_first_page'])
+        for worker, seconds in sorted(startups.items()):
+            print(f"  [worker {worker}] time to first page: {seconds:.2f}s")
+        for report in sorted(self.query_reports, key=lambda r: self.queries.index(r['query'])):
+            status = f"error: {report['error']}" if report['error'] else f"{report['new_events']} new"
+            print(f"  [worker {report['worker']}] {report['query']}: {report['seconds']:.2f}s, {status}")
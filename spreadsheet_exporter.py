@@ -1,34 +1,133 @@
 import pandas as pd
 from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill, Alignment, Border, Side, NamedStyle
+from openpyxl.utils import get_column_letter
 from openpyxl.utils.dataframe import dataframe_to_rows
 from datetime import datetime
-from config import SPREADSHEET_PATH
+from config import SPREADSHEET_PATH, XLSX_STREAMING
+
+SHEET_TITLE = "Greensboro Events"
+URL_COLUMNS = ('Image URL', 'Event URL')
+MAX_COLUMN_WIDTH = 50
+# Excel refuses more hyperlinks than this per worksheet; later URLs are written as plain text
+MAX_HYPERLINKS = 65530
+
+def _thin_border():
+    side = Side(style='thin')
+    return Border(left=side, right=side, top=side, bottom=side)
+
+def _named_styles():
+    """Shared styles for the streaming export; each cell refers to one by name"""
+    alt_fill = PatternFill(start_color="F2F2F2", end_color="F2F2F2", fill_type="solid")
+    link_font = Font(color="0000FF", underline="single")
+    return [
+        NamedStyle('events_title', font=Font(size=16, bold=True)),
+        NamedStyle('events_generated', font=Font(size=10, italic=True)),
+        NamedStyle('events_header', font=Font(bold=True), border=_thin_border(),
+                   fill=PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid"),
+                   alignment=Alignment(horizontal="center")),
+        NamedStyle('events_cell', border=_thin_border()),
+        NamedStyle('events_cell_alt', border=_thin_border(), fill=alt_fill),
+        NamedStyle('events_link', border=_thin_border(), font=link_font),
+        NamedStyle('events_link_alt', border=_thin_border(), font=link_font, fill=alt_fill),
+        NamedStyle('summary_title', font=Font(size=14, bold=True)),
+        NamedStyle('summary_label', font=Font(bold=True))
+    ]
+
+def column_widths(events_df, extra_first_column=()):
+    """Column widths from the longest value per column, computed on whole columns at once"""
+    lengths = events_df.astype(str).apply(lambda column: column.str.len().max()).fillna(0)
+    widths = []
+    for i, (header, length) in enumerate(zip(events_df.columns, lengths)):
+        longest = max(int(length), len(str(header)))
+        if i == 0:
+            longest = max([longest] + [len(text) for text in extra_first_column])
+        widths.append(min(longest + 2, MAX_COLUMN_WIDTH))
+    return widths
 
 class SpreadsheetExporter:
-    def __init__(self):
-        self.workbook = Workbook()
-        self.worksheet = self.workbook.active
-        self.worksheet.title = "Greensboro Events"
+    def __init__(self, path=SPREADSHEET_PATH, streaming=XLSX_STREAMING):
+        self.path = path
+        self.streaming = streaming
+        self.workbook = Workbook(write_only=streaming)
+        if streaming:
+            for style in _named_styles():
+                self.workbook.add_named_style(style)
+            self.worksheet = self.workbook.create_sheet(SHEET_TITLE)
+        else:
+            self.worksheet = self.workbook.active
+            self.worksheet.title = SHEET_TITLE
     
-    def export_events(self, events_df):
-        """Export events DataFrame to Excel with formatting"""
+    def export_events(self, events_df, summary=True, verbose=True):
+        """Export events DataFrame to Excel with formatting, plus a summary sheet"""
         if events_df.empty:
             print("No events to export")
             return
         
-        # Add title and metadata
-        self._add_header()
-        
-        # Add data starting from row 4
-        self._add_data(events_df)
+        if self.streaming:
+            self._stream_events(events_df)
+        else:
+            # Add title and metadata
+            self._add_header()
+            
+            # Add data starting from row 4
+            self._add_data(events_df)
+            
+            # Format the spreadsheet
+            self._format_spreadsheet()
         
-        # Format the spreadsheet
-        self._format_spreadsheet()
+        # The summary has to exist before saving; a write-only workbook saves only once
+        if summary:
+            self.create_summary_sheet(events_df)
         
         # Save the file
-        self.workbook.save(SPREADSHEET_PATH)
-        print(f"Events exported to {SPREADSHEET_PATH}")
+        self.workbook.save(self.path)
+        if verbose:
+            print(f"Events exported to {self.path}")
+    
+    def _cell(self, value, style, worksheet=None):
+        """Write-only cell referring to one of the registered named styles"""
+        cell = WriteOnlyCell(worksheet or self.worksheet, value=value)
+        cell.style = style
+        return cell
+    
+    def _stream_events(self, events_df):
+        """Write the events sheet row by row with a write-only worksheet.
+        
+        Rows are flushed as they are appended, so memory stays flat however
+        large the export is; every cell refers to a shared named style.
+        """
+        ws = self.worksheet
+        generated = f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+        
+        # Column widths must be set before the first row is written
+        for i, width in enumerate(column_widths(events_df, ["Greensboro, NC Events", generated]), 1):
+            ws.column_dimensions[get_column_letter(i)].width = width
+        
+        ws.append([self._cell("Greensboro, NC Events", 'events_title')])
+        ws.append([self._cell(generated, 'events_generated')])
+        ws.append([])
+        ws.append([self._cell(header, 'events_header') for header in events_df.columns])
+        
+        url_positions = {i for i, header in enumerate(events_df.columns) if header in URL_COLUMNS}
+        links = 0
+        # Row 4 is the header; data starts on row 5 and even rows are shaded
+        for row_num, row in enumerate(events_df.itertuples(index=False, name=None), 5):
+            suffix = '_alt' if row_num % 2 == 0 else ''
+            cells = []
+            for i, value in enumerate(row):
+                if (i in url_positions and links < MAX_HYPERLINKS
+                        and value and str(value).startswith('http')):
+                    cell = self._cell(value, 'events_link' + suffix)
+                    cell.hyperlink = value
+                    links += 1
+                else:
+                    cell = self._cell(value, 'events_cell' + suffix)
+                cells.append(cell)
+            ws.append(cells)
+        if links >= MAX_HYPERLINKS:
+            print(f"Only the first {MAX_HYPERLINKS} URLs are hyperlinks (Excel's per-sheet limit)")
     
     def _add_header(self):
         """Add header information to the spreadsheet"""
@@ -80,13 +179,7 @@ class SpreadsheetExporter:
             self.worksheet.column_dimensions[column_letter].width = adjusted_width
         
         # Add borders and alternating row colors
-        from openpyxl.styles import Border, Side
-        thin_border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
-        )
+        thin_border = _thin_border()
         
         # Apply borders to data area
         max_row = self.worksheet.max_row
@@ -105,24 +198,22 @@ class SpreadsheetExporter:
         """Create a summary sheet with statistics"""
         summary_sheet = self.workbook.create_sheet("Summary")
         
+        # Appended in row order so this works for write-only workbooks too
+        summary_sheet.append([self._cell("Event Summary", 'summary_title', summary_sheet) if self.streaming
+                              else "Event Summary"])
+        summary_sheet.append([f"Total Events: {len(events_df)}"])
+        
         # Event count by type
         if 'Event Type' in events_df.columns:
-            event_type_counts = events_df['Event Type'].value_counts()
-            
-            summary_sheet['A1'] = "Event Summary"
-            summary_sheet['A1'].font = Font(size=14, bold=True)
-            
-            summary_sheet['A3'] = "Events by Type:"
-            summary_sheet['A3'].font = Font(bold=True)
-            
-            row = 4
-            for event_type, count in event_type_counts.items():
-                summary_sheet[f'A{row}'] = event_type
-                summary_sheet[f'B{row}'] = count
-                row += 1
+            summary_sheet.append([self._cell("Events by Type:", 'summary_label', summary_sheet) if self.streaming
+                                  else "Events by Type:"])
+            for event_type, count in events_df['Event Type'].value_counts().items():
+                summary_sheet.append([event_type, int(count)])
         
-        # Total events
-        summary_sheet['A2'] = f"Total Events: {len(events_df)}"
+        if not self.streaming:
+            summary_sheet['A1'].font = Font(size=14, bold=True)
+            if 'Event Type' in events_df.columns:
+                summary_sheet['A3'].font = Font(bold=True)
 
 if __name__ == "__main__":
     # Test export
@@ -0,0 +1,123 @@
+"""
+Production serving for the calendar app.
+
+On POSIX the app runs under gunicorn with preload_app: the event data is
+loaded once in the master, and every worker forked from it shares those pages
+copy-on-write. A watcher thread in the master polls the data source and sends
+SIGHUP when it changes. gunicorn's on_reload hook then reloads the data in the
+master before new workers are forked and the old ones finish their in-flight
+requests, so every worker shares the new snapshot too.
+
+With gevent installed the workers are gevent workers, so each idle
+/api/stream (Server-Sent Events) client costs a greenlet instead of a thread.
+Thread-based workers (gthread, sync, waitress) would spend a whole thread on
+every open page, so there the stream is disabled and pages poll /api/version.
+The app's locks are created before gunicorn monkey-patches the worker, but
+nothing inside them yields to the gevent hub, so they are never contended
+between greenlets.
+
+gunicorn does not run on Windows, where waitress serves the app from a single
+process with a thread pool; each request already reloads changed data itself.
+"""
+
+import gc
+import os
+import signal
+import sys
+import threading
+import time
+from config import (
+    HOST, PORT, WSGI_WORKERS, WSGI_THREADS, WSGI_TIMEOUT, WSGI_WORKER_CONNECTIONS, DATA_WATCH_INTERVAL
+)
+
+try:
+    from gunicorn.app.base import BaseApplication
+except ImportError:
+    BaseApplication = None
+
+try:
+    import gevent  # noqa: F401  (only needed as gunicorn's worker class)
+    HAVE_GEVENT = True
+except ImportError:
+    HAVE_GEVENT = False
+
+try:
+    import waitress
+except ImportError:
+    waitress = None
+
+def _watch_data(calendar_app, interval):
+    """Master-side loop: ask gunicorn for a graceful reload whenever the event data changes"""
+    while True:
+        time.sleep(interval)
+        try:
+            if calendar_app.is_stale():
+                print("Event data changed, reloading workers")
+                os.kill(os.getpid(), signal.SIGHUP)
+        except Exception as e:
+            print(f"Error checking event data: {e}")
+
+if BaseApplication is not None:
+    class GunicornServer(BaseApplication):
+        """gunicorn with the Flask app and our hooks, configured in code rather than a config file"""
+
+        def __init__(self, app, calendar_app, options):
+            self.application = app
+            self.calendar_app = calendar_app
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+            self.cfg.set('preload_app', True)
+            self.cfg.set('when_ready', self._when_ready)
+            self.cfg.set('on_reload', self._on_reload)
+            self.cfg.set('pre_fork', self._pre_fork)
+
+        def load(self):
+            return self.application
+
+        def _when_ready(self, server):
+            server.log.info(f"Serving {len(self.calendar_app.events_data)} events "
+                            f"with {server.num_workers} workers")
+            if DATA_WATCH_INTERVAL:
+                threading.Thread(target=_watch_data, args=(self.calendar_app, DATA_WATCH_INTERVAL),
+                                 name='data-watcher', daemon=True).start()
+
+        def _on_reload(self, server):
+            # Runs in the master on SIGHUP, before the replacement workers are forked
+            self.calendar_app.load_events()
+            server.log.info(f"Reloaded {len(self.calendar_app.events_data)} events")
+
+        def _pre_fork(self, server, worker):
+            # Keep the collector from touching (and so copying) the preloaded objects in each worker
+            gc.freeze()
+
+def worker_class(threads):
+    """gunicorn worker class: gevent for many long-lived streams, else threads or plain sync"""
+    if HAVE_GEVENT:
+        return 'gevent'
+    return 'gthread' if threads > 1 else 'sync'
+
+def serve_production(app, calendar_app, host=HOST, port=PORT, workers=WSGI_WORKERS, threads=WSGI_THREADS):
+    """Serve the app with gunicorn, or waitress where gunicorn is unavailable (Windows)"""
+    if BaseApplication is not None and sys.platform != 'win32':
+        options = {
+            'bind': f"{host}:{port}",
+            'workers': workers,
+            'threads': threads,
+            'worker_class': worker_class(threads),
+            'worker_connections': WSGI_WORKER_CONNECTIONS,
+            'timeout': WSGI_TIMEOUT,
+            'graceful_timeout': WSGI_TIMEOUT,
+        }
+        app.config['EVENT_STREAM'] = options['worker_class'] == 'gevent'
+        if not app.config['EVENT_STREAM']:
+            print("gevent is not installed: /api/stream is disabled and pages poll for new data")
+        GunicornServer(app, calendar_app, options).run()
+    elif waitress is not None:
+        app.config['EVENT_STREAM'] = False
+        waitress.serve(app, host=host, port=port, threads=workers * threads)
+    else:
+        raise RuntimeError("serve-prod needs gunicorn (Linux/macOS) or waitress (Windows): pip install gunicorn waitress")